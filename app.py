@@ -2,7 +2,7 @@
 
 import json
 import time
-from pathlib import Path
+from datetime import datetime
 
 import pandas as pd
 import plotly.express as px
@@ -10,6 +10,9 @@ import streamlit as st
 
 from core.config import PALETTE
 from core.utils import inject_css, get_usage_counts
+from core.analytics import GRAINS, get_store
+from core.router import get_router
+from core.telemetry import get_telemetry
 
 # 👉 IMPORTANT: set page + inject CSS BEFORE rendering your custom sidebar
 st.set_page_config(page_title="LearnNext AI", page_icon="🎓", layout="wide")
@@ -77,44 +80,50 @@ usage_df = pd.DataFrame(
     ]
 )
 
-def _load_events():
-    p = Path("data/analytics.json")
-    if not p.exists():
-        return []
-    try:
-        obj = json.loads(p.read_text(encoding="utf-8"))
-    except Exception:
-        return []
-    rows = []
-    for ts, rec in obj.items():
-        try:
-            # allow raw unix ts or already-formatted strings
-            ts_int = int(ts)
-            t = time.strftime("%Y-%m-%d %H:%M", time.localtime(ts_int))
-        except Exception:
-            t = str(ts)
-        rows.append(
-            {
-                "time": t,
-                "event": rec.get("event"),
-                "payload": rec.get("payload", {}) or {},
-            }
-        )
-    # sort by parsed datetime fallback to string
-    def _key(r):
-        try:
-            return pd.to_datetime(r["time"])
-        except Exception:
-            return r["time"]
-    return sorted(rows, key=_key)
+store = get_store()
+# changes on every write/compaction; keys the cached figures below so they are
+# rebuilt only when the data changed, and shared by every session
+log_version = store.version()
 
-events = _load_events()
-timeline_df = pd.DataFrame(events)
+def _load_events(n: int):
+    """Newest n events, newest first; the store reads them from the end of the log."""
+    rows = store.tail(n)
+    for r in rows:
+        r["time"] = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["ts"]))
+    return rows
 
-c1, c2 = st.columns([1.3, 1])
-with c1:
-    st.subheader("Usage by feature")
-    fig_bar = px.bar(usage_df, x="feature", y="count", text="count", title=None)
+events = _load_events(12)
+
+# range label -> (seconds back, rollup grain); None = all time
+ACTIVITY_RANGES = {
+    "Last hour": (3600, "minute"),
+    "Last 24h": (86400, "hour"),
+    "Last 7 days": (7 * 86400, "hour"),
+    "Last 90 days": (90 * 86400, "day"),
+    "All time": (None, "day"),
+}
+
+def _activity_frame(range_label: str) -> pd.DataFrame:
+    """Per-bucket event totals for the chosen range, read from the pre-aggregated rollups."""
+    span, grain = ACTIVITY_RANGES[range_label]
+    now = time.time()
+    since = now - span if span else None
+    rows = store.rollup(grain, since=since, until=now)
+    if not rows:
+        return pd.DataFrame(columns=["dt", "events"])
+    df = pd.DataFrame(rows, columns=["bucket", "event", "n"]).groupby("bucket", as_index=False)["n"].sum()
+    # fill empty buckets so the area chart drops to zero between bursts
+    size = GRAINS[grain]
+    start = int(since // size * size) if since else int(df["bucket"].iloc[0])
+    full = pd.DataFrame({"bucket": range(start, int(now // size * size) + 1, size)})
+    df = full.merge(df, on="bucket", how="left").fillna({"n": 0})
+    local_tz = datetime.now().astimezone().tzinfo
+    df["dt"] = pd.to_datetime(df["bucket"], unit="s", utc=True).dt.tz_convert(local_tz).dt.tz_localize(None)
+    return df.rename(columns={"n": "events"})[["dt", "events"]]
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _usage_figure(counts: tuple):
+    fig_bar = px.bar(pd.DataFrame(counts, columns=["feature", "count"]), x="feature", y="count", text="count", title=None)
     fig_bar.update_traces(textposition="outside")
     fig_bar.update_layout(
         height=380,
@@ -122,33 +131,85 @@ with c1:
         xaxis_title=None,
         yaxis_title=None,
     )
+    return fig_bar
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _activity_figure(range_label: str, version: tuple, bucket: int):
+    """None when the range is empty. 'version'/'bucket' only key the cache."""
+    agg = _activity_frame(range_label)
+    if agg.empty or agg["events"].sum() == 0:
+        return None
+    fig_area = px.area(agg, x="dt", y="events", title=None)
+    fig_area.update_layout(
+        height=380,
+        margin=dict(l=10, r=10, t=10, b=10),
+        xaxis_title=None,
+        yaxis_title=None,
+    )
+    return fig_area
+
+c1, c2 = st.columns([1.3, 1])
+with c1:
+    st.subheader("Usage by feature")
+    fig_bar = _usage_figure(tuple(usage_df.itertuples(index=False, name=None)))
     st.plotly_chart(fig_bar, use_container_width=True)
 
 with c2:
     st.subheader("Activity over time")
-    if not timeline_df.empty:
-        # group by minute; if your app logs faster, adjust here
-        agg = (
-            timeline_df.assign(dt=pd.to_datetime(timeline_df["time"], errors="coerce"))
-            .dropna(subset=["dt"])
-            .groupby(pd.Grouper(key="dt", freq="1min"))
-            .size()
-            .reset_index(name="events")
-        )
-        if not agg.empty:
-            fig_area = px.area(agg, x="dt", y="events", title=None)
-            fig_area.update_layout(
-                height=380,
-                margin=dict(l=10, r=10, t=10, b=10),
-                xaxis_title=None,
-                yaxis_title=None,
-            )
+    if total:
+        activity_range = st.selectbox("Range", list(ACTIVITY_RANGES), index=1, label_visibility="collapsed")
+        bucket_size = GRAINS[ACTIVITY_RANGES[activity_range][1]]
+        fig_area = _activity_figure(activity_range, log_version, int(time.time() // bucket_size))
+        if fig_area is not None:
             st.plotly_chart(fig_area, use_container_width=True)
         else:
-            st.caption("No timestamped events yet — interact with features to populate this chart.")
+            st.caption("No activity in this range — pick a wider range or interact with features.")
     else:
         st.caption("No activity yet — start using features and charts will populate.")
 
+# ---------- BREAKDOWNS ----------
+# served from the store's per-day payload indexes, not a scan of the log
+if total:
+    with st.expander("Breakdowns", expanded=False):
+        b1, b2 = st.columns(2)
+        with b1:
+            st.markdown("**Academic Q&A by domain**")
+            qna_rows = store.breakdown("qna", "domain")
+            if qna_rows:
+                st.dataframe(pd.DataFrame([(v, n) for v, n, _ in qna_rows], columns=["domain", "questions"]),
+                             hide_index=True, use_container_width=True)
+            else:
+                st.caption("No questions yet.")
+        with b2:
+            st.markdown("**Quiz accuracy by topic**")
+            quiz_rows = store.breakdown("quiz", "topic", metric="acc")
+            if quiz_rows:
+                st.dataframe(pd.DataFrame([(v, n, round(100 * (m or 0), 1)) for v, n, m in quiz_rows],
+                                          columns=["topic", "quizzes", "avg accuracy %"]),
+                             hide_index=True, use_container_width=True)
+            else:
+                st.caption("No quizzes yet.")
+
+# ---------- MODEL LATENCY ----------
+# in-process histograms from core/telemetry.py (since this server started)
+latency_rows = get_telemetry().snapshot()
+if latency_rows:
+    with st.expander("Model latency & tokens", expanded=False):
+        lat_df = pd.DataFrame(latency_rows)
+        for col in ("p50_ms", "p95_ms", "p99_ms", "queue_p95_ms"):
+            lat_df[col] = lat_df[col].round(0)
+        st.dataframe(
+            lat_df[["feature", "provider", "model", "calls", "errors", "cached", "coalesced",
+                    "p50_ms", "p95_ms", "p99_ms", "queue_p95_ms", "prompt_tokens", "completion_tokens"]],
+            hide_index=True, use_container_width=True,
+        )
+        st.caption("Latency covers calls that reached the provider; cached and coalesced requests are counted "
+                   "separately. Queue is time spent waiting on rate limits, retries or cold models.")
+        routing = get_router().stats()
+        if routing["hedges"]:
+            st.caption(f"Hedged requests: {routing['hedges']} sent to a second model, "
+                       f"{routing['hedge_wins']} answered first.")
+
 st.markdown("---")
 
 # ---------- FEATURE SHOWCASE ----------
@@ -223,7 +284,7 @@ st.subheader("Recent activity")
 if not events:
     st.caption("No activity yet — your interactions will appear here in real time.")
 else:
-    for e in list(reversed(events))[:12]:
+    for e in events:
         pretty = (
             json.dumps(e.get("payload") or {}, ensure_ascii=False, indent=2)
             if e.get("payload") is not None
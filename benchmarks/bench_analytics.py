@@ -0,0 +1,162 @@
+# benchmarks/bench_analytics.py
+#
+# How the analytics paths behave as the event log grows.
+# For each backend and history size, a fresh store is filled with synthetic
+# events and we time:
+#   bulk_ev_s     bulk load throughput (append_many in large batches)
+#   append_ev_s   steady-state record rate at that size (1 event per append)
+#   counts_ms     get_usage_counts() / sidebar cost (store.counts())
+#   dash_ms       dashboard data prep: version + counts + activity rollups
+#                 for every range + tail(12) for Recent activity
+#   query_ms      breakdown(): quiz accuracy by topic (all time) + Q&A by
+#                 domain (last 7 days), from the facet indexes
+#   columns_s     cold NumPy column load (store.columns())
+#   incr_ms       column refresh after 100 new events
+# Latencies are medians over repeated calls.
+#
+# Run from the repo root:
+#   python -m benchmarks.bench_analytics                          # 1k..100k, both backends
+#   python -m benchmarks.bench_analytics --sizes 1000 1000000 10000000 --backend sqlite
+#   python -m benchmarks.bench_analytics --json bench.json        # save results
+#   python -m benchmarks.bench_analytics --compare bench.json     # ratios vs a saved run
+#
+# 10M events need several GB of disk and a while to generate.
+
+import argparse, json, random, statistics, sys, tempfile, time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+from core.analytics import BACKENDS, open_store
+
+EVENT_TYPES = ["qna", "coding", "summaries", "transcripts", "wellness", "quiz"]
+DOMAINS = ["general", "math", "cs", "biology", "economics", "history"]
+LANGS = ["python", "javascript", "java", "c++", "c", "go", "rust"]
+TOPICS = ["Time Complexity & Big-O", "SQL Basics & Joins", "OOP Principles", "Networking: OSI vs TCP/IP",
+          "Linear Algebra (Vectors/Matrices)", "Data Structures (Arrays/Stacks/Queues)"]
+# quiz topics are free text: most quizzes use a preset, the rest spread over this many distinct topics,
+# so the facet indexes see realistic cardinality
+FREE_TOPICS = 20_000
+
+# dashboard ranges, mirrored from app.ACTIVITY_RANGES: (seconds back, grain)
+DASH_RANGES = [(3600, "minute"), (86400, "hour"), (7 * 86400, "hour"), (90 * 86400, "day"), (None, "day")]
+
+def synthetic_events(n: int, days: float = 30.0, seed: int = 7) -> Iterator[Dict[str, Any]]:
+    """n events spread evenly over the last 'days', with payloads shaped like the real pages'."""
+    rnd = random.Random(seed)
+    now = time.time()
+    start = now - days * 86400
+    step = (now - start) / max(1, n)
+    for i in range(n):
+        ev = rnd.choice(EVENT_TYPES)
+        if ev == "qna":
+            payload = {"question": "q%d" % rnd.randrange(5000), "domain": rnd.choice(DOMAINS)}
+        elif ev == "coding":
+            payload = {"type": rnd.choice(["review", "debug", "concept"]), "lang": rnd.choice(LANGS)}
+        elif ev == "quiz":
+            topic = rnd.choice(TOPICS) if rnd.random() < 0.3 else "custom topic %d" % rnd.randrange(FREE_TOPICS)
+            payload = {"topic": topic, "n": 5, "acc": round(rnd.random(), 2)}
+        elif ev == "summaries":
+            payload = {"chars": rnd.randrange(200, 20000)}
+        elif ev == "transcripts":
+            payload = {"source": "youtube", "len": rnd.randrange(1000, 50000)}
+        else:
+            payload = {"len": rnd.randrange(10, 400)}
+        yield {"ts": start + i * step, "event": ev, "payload": payload}
+
+def _median_ms(fn: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples)
+
+def _dashboard_prep(store):
+    now = time.time()
+    store.version()
+    store.counts()
+    for span, grain in DASH_RANGES:
+        store.rollup(grain, since=now - span if span else None, until=now)
+    store.tail(12)
+
+def _queries(store):
+    store.breakdown("quiz", "topic", metric="acc")
+    store.breakdown("qna", "domain", since=time.time() - 7 * 86400)
+
+def run_one(backend: str, size: int, batch: int, repeat: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(backend, Path(tmp))
+        t = time.perf_counter()
+        pending: List[Dict[str, Any]] = []
+        for e in synthetic_events(size):
+            pending.append(e)
+            if len(pending) >= batch:
+                store.append_many(pending)
+                pending = []
+        store.append_many(pending)
+        bulk = size / (time.perf_counter() - t)
+
+        appends = 2000  # long enough to include the periodic fold of pending rollup deltas (jsonl)
+        t = time.perf_counter()
+        for i in range(appends):
+            store.append("qna", {"question": "bench", "domain": "cs"})
+        append_rate = appends / (time.perf_counter() - t)
+
+        counts_ms = _median_ms(store.counts, repeat)
+        dash_ms = _median_ms(lambda: _dashboard_prep(store), repeat)
+        query_ms = _median_ms(lambda: _queries(store), repeat)
+
+        t = time.perf_counter()
+        store.columns()
+        columns_s = time.perf_counter() - t
+        store.append_many([{"ts": time.time(), "event": "quiz", "payload": {"acc": 1.0}} for _ in range(100)])
+        t = time.perf_counter()
+        store.columns()
+        incr_ms = (time.perf_counter() - t) * 1000
+
+    return {"backend": backend, "size": size, "bulk_ev_s": bulk, "append_ev_s": append_rate,
+            "counts_ms": counts_ms, "dash_ms": dash_ms, "query_ms": query_ms, "columns_s": columns_s, "incr_ms": incr_ms}
+
+COLUMNS = [("backend", "{:<7}"), ("size", "{:>10,}"), ("bulk_ev_s", "{:>11,.0f}"), ("append_ev_s", "{:>11,.0f}"),
+           ("counts_ms", "{:>10.3f}"), ("dash_ms", "{:>9.3f}"), ("query_ms", "{:>9.3f}"),
+           ("columns_s", "{:>10.3f}"), ("incr_ms", "{:>9.2f}")]
+
+def print_table(results: List[Dict[str, Any]], baseline: Dict[tuple, Dict[str, Any]] = None):
+    print("  ".join(("{:>%d}" % len(fmt.format(results[0][k]))).format(k) for k, fmt in COLUMNS))
+    for r in results:
+        print("  ".join(fmt.format(r[k]) for k, fmt in COLUMNS))
+        old = (baseline or {}).get((r["backend"], r["size"]))
+        if old:
+            # >1.00 means slower than the baseline (lower throughput or higher latency)
+            ratios = []
+            for k, _ in COLUMNS[2:]:
+                if old.get(k):
+                    ratio = old[k] / r[k] if k.endswith("_ev_s") else r[k] / old[k]
+                    ratios.append(f"{k}={ratio:.2f}x")
+            print("      vs baseline: " + "  ".join(ratios))
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Analytics store benchmarks over synthetic histories.")
+    ap.add_argument("--backend", choices=list(BACKENDS), action="append", help="default: all")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--batch", type=int, default=10_000, help="events per append_many during bulk load")
+    ap.add_argument("--repeat", type=int, default=50, help="samples per latency median")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="print slowdown ratios against a previous --json file")
+    args = ap.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        baseline = {(r["backend"], r["size"]): r for r in json.loads(Path(args.compare).read_text())}
+    results = []
+    for backend in args.backend or list(BACKENDS):
+        for size in args.sizes:
+            results.append(run_one(backend, size, args.batch, args.repeat))
+            print(f"... {backend} {size:,} done", file=sys.stderr)
+    print_table(results, baseline)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
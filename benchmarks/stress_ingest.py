@@ -0,0 +1,110 @@
+# benchmarks/stress_ingest.py
+#
+# Concurrent-ingestion stress test for the analytics event store.
+# Many processes x threads hammer one store; afterwards every event must be
+# present exactly once, ids must be unique and contiguous, and the counters
+# and rollups must agree with the raw log.
+#
+# Run from the repo root:
+#   python -m benchmarks.stress_ingest                       # both backends
+#   python -m benchmarks.stress_ingest --backend jsonl --procs 8 --threads 4 --events 500
+#   python -m benchmarks.stress_ingest --buffered            # through BufferedWriter
+#
+# Exits non-zero if any event was lost or duplicated.
+
+import argparse, multiprocessing as mp, sys, tempfile, threading, time
+from pathlib import Path
+
+from core.analytics import BACKENDS, GRAINS, BufferedWriter, open_store
+
+EVENT_TYPES = ["qna", "coding", "summaries", "transcripts", "wellness", "quiz"]
+
+def _worker(backend: str, data_dir: str, proc: int, threads: int, events: int, batch: int, buffered: bool):
+    store = open_store(backend, Path(data_dir))
+    # small queue so bursts exercise the writer's backpressure path
+    writer = BufferedWriter(store, max_batch=batch, max_queue=64) if buffered else None
+
+    def run(thread: int):
+        pending = []
+        for i in range(events):
+            e = {"ts": time.time(), "event": EVENT_TYPES[i % len(EVENT_TYPES)],
+                 "payload": {"proc": proc, "thread": thread, "i": i}}
+            if writer:
+                writer.submit(e)
+                continue
+            pending.append(e)
+            if len(pending) >= batch:
+                store.append_many(pending)
+                pending = []
+        store.append_many(pending)
+
+    ts = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    if writer:
+        writer.close()
+
+def check(backend: str, procs: int, threads: int, events: int, batch: int, buffered: bool = False) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        open_store(backend, Path(tmp))  # create schema/files up front
+        started = time.perf_counter()
+        ctx = mp.get_context("spawn")
+        ps = [ctx.Process(target=_worker, args=(backend, tmp, p, threads, events, batch, buffered)) for p in range(procs)]
+        for p in ps:
+            p.start()
+        for p in ps:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+        store = open_store(backend, Path(tmp))
+        expected = procs * threads * events
+        seen, ids = set(), []
+        for e in store.iter_events():
+            pl = e["payload"]
+            seen.add((pl["proc"], pl["thread"], pl["i"]))
+            ids.append(e["id"])
+        by_type, total = store.counts()
+        rollup_totals = {g: sum(n for _, _, n in store.rollup(g)) for g in GRAINS}
+
+        problems = []
+        if any(p.exitcode != 0 for p in ps):
+            problems.append("a writer process crashed")
+        if len(seen) != expected or len(ids) != expected:
+            problems.append(f"expected {expected} events, log has {len(ids)} ({len(seen)} distinct)")
+        if len(set(ids)) != len(ids):
+            problems.append("duplicate ids")
+        if sorted(ids) != list(range(1, len(ids) + 1)):
+            problems.append("ids are not contiguous from 1")
+        if ids != sorted(ids):
+            problems.append("ids are not monotonic in log order")
+        if total != expected:
+            problems.append(f"counters total {total} != {expected}")
+        for g, n in rollup_totals.items():
+            if n != expected:
+                problems.append(f"{g} rollups total {n} != {expected}")
+
+        rate = expected / elapsed if elapsed else 0
+        status = "OK" if not problems else "FAIL: " + "; ".join(problems)
+        print(f"[{backend}] {procs} procs x {threads} threads x {events} events "
+              f"(batch {batch}{', buffered' if buffered else ''}) in {elapsed:.2f}s = {rate:,.0f} ev/s  ->  {status}")
+        return not problems
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Concurrent-ingestion stress test for the analytics event store.")
+    ap.add_argument("--backend", choices=list(BACKENDS), action="append",
+                    help="backend(s) to test; default: all")
+    ap.add_argument("--procs", type=int, default=6)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--events", type=int, default=250, help="events per thread")
+    ap.add_argument("--batch", type=int, default=1, help="events per append_many call")
+    ap.add_argument("--buffered", action="store_true", help="write through BufferedWriter")
+    args = ap.parse_args(argv)
+    ok = True
+    for backend in args.backend or list(BACKENDS):
+        ok &= check(backend, args.procs, args.threads, args.events, args.batch, args.buffered)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1203 @@
+# core/analytics.py
+#
+# Event store behind core.utils.record_event. Every write is an O(1) append;
+# nothing ever rewrites the history.
+#
+# Env (set via .env or Streamlit Secrets):
+#   ANALYTICS_BACKEND=jsonl   # jsonl: append-only JSON lines log (default)
+#                             # sqlite: local SQLite database in WAL mode
+#   DATA_DIR=data             # where the store lives
+#   ANALYTICS_ASYNC=1         # record() hands events to a background writer
+#   ANALYTICS_BATCH_SIZE=200  # writer flushes after this many events...
+#   ANALYTICS_FLUSH_SEC=0.5   # ...or this many seconds, whichever first
+#   ANALYTICS_QUEUE_MAX=10000 # bound on queued events; callers block when full
+#   ANALYTICS_SEGMENT_MAX_BYTES=8388608  # jsonl: rotate segment at this size (and daily)
+#   ANALYTICS_RETENTION_DAYS=30          # raw events kept this long; 0 = forever
+#   ANALYTICS_MINUTE_RETENTION_DAYS=7    # minute buckets kept this long; 0 = forever
+#   ANALYTICS_COMPACT_EVERY_SEC=3600     # the writer thread runs compact() this often
+#
+# Each backend also keeps, updated together with every append (for jsonl:
+# appended to a small pending log that compaction folds in):
+#   - a per-event-type counters record, so usage counts never rescan history
+#   - minute/hour/day rollups (UTC-aligned buckets), so the activity chart
+#     reads only the buckets in its range
+#   - per-day facet indexes over selected payload keys (FACET_KEYS), with
+#     sums of numeric ones (METRIC_KEYS), so store.breakdown() answers
+#     "Q&A volume by domain" or "quiz accuracy by topic" without a scan
+# compact() then drops raw events past retention: their totals live on in
+# the counters, hour/day rollups and facets, so the hot working set stays small.
+#
+# store.select() filters raw events by type, time range and payload values
+# (SQL indexes for sqlite, the NumPy columns below for jsonl).
+#
+# store.tail(n) returns the newest n events without scanning history (reverse
+# block reads of the newest jsonl segments; ORDER BY id DESC for sqlite).
+#
+# For dashboard work, store.columns() returns the raw events as NumPy arrays
+# (ids, timestamps, event-type codes), cached per store and keyed by
+# store.version(): new events are appended incrementally, and the cache is
+# rebuilt only after compaction.
+#
+# Writers are safe across threads and processes: every event gets a unique,
+# monotonically increasing integer 'id' assigned under the store's write lock
+# (an exclusive lock file for jsonl, BEGIN IMMEDIATE for sqlite).
+#
+# The legacy data/analytics.json (one big dict rewritten on every event) is
+# imported into the configured store once, then renamed to *.migrated.
+
+import atexit, json, logging, os, queue, re, sqlite3, threading, time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    ANALYTICS_BACKEND, ANALYTICS_ASYNC, ANALYTICS_BATCH_SIZE, ANALYTICS_FLUSH_SEC, ANALYTICS_QUEUE_MAX,
+    ANALYTICS_SEGMENT_MAX_BYTES, ANALYTICS_RETENTION_DAYS, ANALYTICS_MINUTE_RETENTION_DAYS,
+    ANALYTICS_COMPACT_EVERY_SEC, DATA_DIR as _DATA_DIR,
+)
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = Path(_DATA_DIR)
+LEGACY_LOG_FILE = DATA_DIR / "analytics.json"
+
+GRAINS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# jsonl: fold pending rollup deltas into the per-day files once they reach this size (and on compact())
+ROLLUP_PENDING_MAX_BYTES = 256 * 1024
+
+_KEY_RE = re.compile(r"\w+")
+
+# payload keys indexed per day for breakdown(), and the numeric keys it can average
+FACET_KEYS = ("domain", "feature", "type", "lang", "topic", "course", "source")
+METRIC_KEYS = ("acc", "chars", "n", "len")
+
+def make_event(event_type: str, payload: Optional[Dict[str, Any]] = None, ts: Optional[float] = None) -> Dict[str, Any]:
+    return {"ts": float(ts if ts is not None else time.time()), "event": event_type, "payload": payload or {}}
+
+class EventColumns(NamedTuple):
+    """Column-oriented snapshot of the raw events; row i is ids[i], ts[i], names[codes[i]], payloads[i]."""
+    version: Tuple[Any, ...]
+    ids: np.ndarray        # int64, ascending
+    ts: np.ndarray         # float64 unix seconds
+    codes: np.ndarray      # int32 index into names
+    names: List[str]
+    payloads: List[Dict[str, Any]]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def code(self, event_type: str) -> int:
+        """Code for 'event_type', or -1 if it never occurs."""
+        try:
+            return self.names.index(event_type)
+        except ValueError:
+            return -1
+
+    def rows(self, idx) -> List[Dict[str, Any]]:
+        """Materialize selected rows (an index array or slice) back into event dicts."""
+        idx = np.arange(len(self))[idx]
+        return [{"id": int(self.ids[i]), "ts": float(self.ts[i]), "event": self.names[self.codes[i]],
+                 "payload": self.payloads[i]} for i in idx]
+
+def _build_columns(version, events, base: Optional[EventColumns] = None) -> EventColumns:
+    names = list(base.names) if base else []
+    index = {n: i for i, n in enumerate(names)}
+    payloads = list(base.payloads) if base else []
+    ids, ts, codes = [], [], []
+    for e in events:
+        k = e.get("event")
+        if k not in index:
+            index[k] = len(names)
+            names.append(k)
+        ids.append(e.get("id") or 0)
+        ts.append(e["ts"])
+        codes.append(index[k])
+        payloads.append(e.get("payload") or {})
+    new = (np.asarray(ids, dtype=np.int64), np.asarray(ts, dtype=np.float64), np.asarray(codes, dtype=np.int32))
+    if base is not None:
+        new = tuple(np.concatenate([old, add]) for old, add in zip((base.ids, base.ts, base.codes), new))
+    return EventColumns(version, new[0], new[1], new[2], names, payloads)
+
+# --------------------- Backends ---------------------
+
+class EventStore:
+    """
+    Storage backend for analytics events. An event is a dict with
+    'id' (assigned by the store), 'ts' (unix seconds), 'event' (type)
+    and 'payload'.
+    Subclasses implement append_many() and iter_events(); counts() falls
+    back to a full scan unless the backend maintains counters.
+    """
+    name = "base"
+
+    def append(self, event_type: str, payload: Optional[Dict[str, Any]] = None, ts: Optional[float] = None) -> int:
+        return self.append_many([make_event(event_type, payload, ts)])[0]
+
+    def append_many(self, events: List[Dict[str, Any]]) -> List[int]:
+        """Append events atomically; returns their ids."""
+        raise NotImplementedError
+
+    def iter_events(self, after_id: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield events with id > after_id, oldest first."""
+        raise NotImplementedError
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """Newest n events, newest first."""
+        return list(reversed(deque(self.iter_events(), maxlen=max(0, n))))
+
+    def version(self) -> Tuple[Any, ...]:
+        """
+        Changes whenever the raw log changes: (oldest-retained marker, last id).
+        The first part only changes on compaction.
+        """
+        last = 0
+        for e in self.iter_events():
+            last = e.get("id") or last
+        return (0, last)
+
+    def columns(self) -> EventColumns:
+        """
+        Raw events as NumPy columns, cached on the store. Appends since the
+        cached version are read incrementally (iter_events(after_id)); a
+        compaction triggers a full reload.
+        """
+        v = self.version()
+        lock = self.__dict__.setdefault("_columns_lock", threading.Lock())
+        with lock:
+            cached: Optional[EventColumns] = getattr(self, "_columns", None)
+            if cached is not None and cached.version == v:
+                return cached
+            if cached is not None and cached.version[0] == v[0] and len(cached):
+                cols = _build_columns(v, self.iter_events(after_id=int(cached.ids[-1])), base=cached)
+            else:
+                cols = _build_columns(v, self.iter_events())
+            self._columns = cols
+            return cols
+
+    def counts(self) -> Tuple[Dict[str, int], int]:
+        """Return ({event_type: n}, total)."""
+        return _count(self.iter_events())
+
+    def rollup(self, grain: str, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[int, str, int]]:
+        """
+        Return (bucket_start, event_type, n) rows for 'grain' (minute/hour/day),
+        bucket_start in [since, until], oldest first.
+        """
+        lo, hi = _bucket_range(grain, since, until)
+        rows = _rollups(self.iter_events()).items()
+        return sorted((b, e, n) for (g, b, e), n in rows if g == grain and lo <= b <= hi)
+
+    def compact(self, retention_days: float = ANALYTICS_RETENTION_DAYS,
+                minute_retention_days: float = ANALYTICS_MINUTE_RETENTION_DAYS) -> Dict[str, int]:
+        """Apply retention; returns what was removed. No-op for stores without aggregates."""
+        return {}
+
+    def select(self, event_type: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+               where: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Raw events matching type, ts in [since, until] and payload[k] == v for
+        every item of 'where', newest first, at most 'limit'. Type and time
+        filters are vectorized over columns(); only matching payloads are checked.
+        """
+        cols = self.columns()
+        mask = np.ones(len(cols), dtype=bool)
+        if event_type is not None:
+            mask &= cols.codes == cols.code(event_type)
+        if since is not None:
+            mask &= cols.ts >= since
+        if until is not None:
+            mask &= cols.ts <= until
+        out = []
+        for i in np.flatnonzero(mask)[::-1]:
+            p = cols.payloads[i]
+            if where and any(p.get(k) != v for k, v in where.items()):
+                continue
+            out.extend(cols.rows([i]))
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+    def breakdown(self, event_type: str, by: str, metric: Optional[str] = None,
+                  since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[str, int, Optional[float]]]:
+        """
+        Events of 'event_type' grouped by payload[by], largest group first:
+        (value, count, mean of payload[metric] or None).
+        When 'by' is in FACET_KEYS and 'metric' is None or in METRIC_KEYS this
+        reads the facet indexes and since/until are widened to whole UTC days;
+        otherwise it filters raw events (retained ones only).
+        """
+        if by in FACET_KEYS and (metric is None or metric in METRIC_KEYS):
+            groups = self._facet_groups(event_type, by, metric, since, until)
+            if groups is not None:
+                return _breakdown_rows(groups)
+        groups = {}
+        for e in self.select(event_type, since=since, until=until):
+            p = e["payload"]
+            if by not in p:
+                continue
+            g = groups.setdefault(_facet_value(p[by]), [0, 0, 0.0])
+            g[0] += 1
+            x = p.get(metric) if metric else None
+            if _is_number(x):
+                g[1] += 1
+                g[2] += float(x)
+        return _breakdown_rows(groups)
+
+    def _facet_groups(self, event_type: str, by: str, metric: Optional[str], since: Optional[float],
+                      until: Optional[float]) -> Optional[Dict[str, List[float]]]:
+        """{value: [count, n_with_metric, metric_sum]} from facet indexes; None if the store has none."""
+        return None
+
+def _count(events) -> Tuple[Dict[str, int], int]:
+    by_type: Dict[str, int] = {}
+    for e in events:
+        k = e.get("event")
+        by_type[k] = by_type.get(k, 0) + 1
+    return by_type, sum(by_type.values())
+
+def _rollups(events) -> Dict[Tuple[str, int, str], int]:
+    """{(grain, bucket_start, event_type): n} for every grain."""
+    out: Dict[Tuple[str, int, str], int] = {}
+    for e in events:
+        for grain, size in GRAINS.items():
+            key = (grain, int(e["ts"] // size * size), e.get("event"))
+            out[key] = out.get(key, 0) + 1
+    return out
+
+def _is_number(x) -> bool:
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+def _facet_value(v) -> str:
+    return str(v).strip()[:120]
+
+def _facets(events) -> Dict[Tuple[int, str, str, str, str], List[float]]:
+    """
+    {(day_bucket, event_type, key, value, metric): [n, total]} over FACET_KEYS.
+    metric '' counts events; other metrics count events carrying that numeric
+    payload key and sum it.
+    """
+    out: Dict[Tuple[int, str, str, str, str], List[float]] = {}
+    for e in events:
+        p = e.get("payload") or {}
+        keys = [k for k in FACET_KEYS if k in p and p[k] is not None and not isinstance(p[k], (dict, list))]
+        if not keys:
+            continue
+        day = int(e["ts"] // 86400 * 86400)
+        metrics = [("", 0.0)] + [(m, float(p[m])) for m in METRIC_KEYS if _is_number(p.get(m))]
+        for k in keys:
+            v = _facet_value(p[k])
+            for m, x in metrics:
+                acc = out.setdefault((day, e.get("event"), k, v, m), [0, 0.0])
+                acc[0] += 1
+                acc[1] += x
+    return out
+
+def _merge_facet_tree(tree: Dict[str, Any], rows, day: Optional[int] = None):
+    """Add _facets() rows (optionally only those of one day) into {event: {key: {metric: {value: [n, total]}}}}."""
+    for (d, event, key, value, metric), (n, total) in rows:
+        if day is not None and d != day:
+            continue
+        acc = tree.setdefault(event, {}).setdefault(key, {}).setdefault(metric, {}).setdefault(value, [0, 0.0])
+        acc[0] += n
+        acc[1] += total
+
+def _add_facet_tree(acc: Dict[str, Any], tree: Dict[str, Any]):
+    """acc += tree, both {event: {key: {metric: {value: [n, total]}}}}."""
+    for event, keys in tree.items():
+        for key, metrics in keys.items():
+            for metric, values in metrics.items():
+                for value, (n, total) in values.items():
+                    cell = acc.setdefault(event, {}).setdefault(key, {}).setdefault(metric, {}).setdefault(value, [0, 0.0])
+                    cell[0] += n
+                    cell[1] += total
+
+def _groups_from_tree(groups: Dict[str, List[float]], tree: Dict[str, Any], event_type: str, by: str, metric: str):
+    node = tree.get(event_type, {}).get(by, {})
+    for value, (n, _t) in node.get("", {}).items():
+        groups.setdefault(value, [0, 0, 0.0])[0] += n
+    if metric:
+        for value, (n, total) in node.get(metric, {}).items():
+            g = groups.setdefault(value, [0, 0, 0.0])
+            g[1] += n
+            g[2] += total
+
+def _breakdown_rows(groups: Dict[str, List[float]]) -> List[Tuple[str, int, Optional[float]]]:
+    rows = [(v, int(n), (total / nm) if nm else None) for v, (n, nm, total) in groups.items() if n]
+    return sorted(rows, key=lambda r: (-r[1], r[0]))
+
+def _bucket_range(grain: str, since: Optional[float], until: Optional[float]) -> Tuple[int, int]:
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain '{grain}'. Use one of: {', '.join(GRAINS)}")
+    size = GRAINS[grain]
+    lo = int(since // size * size) if since is not None else 0
+    hi = int(until // size * size) if until is not None else 2**62
+    return lo, hi
+
+def _day_name(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive inter-process lock on 'path' (flock on POSIX, msvcrt on Windows)."""
+    with open(path, "a+b") as fh:
+        if os.name == "nt":
+            import msvcrt
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10s; keep waiting
+            try:
+                yield
+            finally:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+class JsonlEventStore(EventStore):
+    """
+    Append-only JSON lines, split into segments/seg-<first id>-<YYYYMMDD>.jsonl.
+    A new segment starts when the active one reaches ANALYTICS_SEGMENT_MAX_BYTES
+    or the UTC day of the events changes (within a batch too); compact()
+    deletes sealed segments whose newest event is past retention.
+    Counters live next to the log in counters.json, a small file replaced
+    atomically (write temp file + os.replace) after each batch. Rollups live
+    in rollups/<YYYY-MM-DD>.json (minute + hour buckets and facets of one UTC
+    day) and rollups/days.json (day buckets); these grow with the day's
+    volume and its free-text facet values, so a batch only appends its deltas
+    to rollups/pending-<first id>.jsonl, which reads add on top (parsing only
+    lines new since their last read) and compact() (or the pending log
+    reaching ROLLUP_PENDING_MAX_BYTES) folds into the files.
+    The all-time facet index (rollups/facets.json) is likewise never touched
+    by appends: breakdown() folds finished days into it on read.
+    Writers hold the .lock file for the whole batch; ids continue from the
+    last id written, so they stay unique even after a crash mid-batch.
+    """
+    name = "jsonl"
+
+    def __init__(self, root: Path, segment_max_bytes: int = ANALYTICS_SEGMENT_MAX_BYTES):
+        self.root = Path(root)
+        self.segment_dir = self.root / "segments"
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = int(segment_max_bytes)
+        self.counters_path = self.root / "counters.json"
+        self.rollup_dir = self.root / "rollups"
+        self.facets_path = self.rollup_dir / "facets.json"
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_cache: Dict[Path, Tuple[int, Dict, Dict]] = {}  # path -> (bytes parsed, rows, facets)
+        with self._locked():
+            legacy = self.root / "events.jsonl"  # single-file log from before segments
+            if legacy.exists():
+                first = next(_read_lines(legacy), None)
+                if first is None:
+                    legacy.unlink()
+                else:
+                    legacy.rename(self._segment_path(int(first.get("id") or 1), first["ts"]))
+            state = self._state()
+            if self.segments() and not (self.counters_path.exists() and self.rollup_dir.exists()
+                                        and ("facets" in state or state.get("facet_index"))):
+                self._rebuild_aggregates()
+            elif "facets" in state:
+                # all-time facets used to live here, rewritten on every append; the per-day files hold them too
+                del state["facets"]
+                state["facet_index"] = 1
+                self._write_state(state)
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock + inter-process file lock."""
+        with self._lock, _file_lock(self.root / ".lock"):
+            yield
+
+    # ---- segments ----
+
+    def segments(self) -> List[Path]:
+        """Segment files, oldest first (names sort by first id)."""
+        return sorted(self.segment_dir.glob("seg-*.jsonl"))
+
+    def _segment_path(self, first_id: int, ts: float) -> Path:
+        return self.segment_dir / f"seg-{first_id:012d}-{time.strftime('%Y%m%d', time.gmtime(ts))}.jsonl"
+
+    def _active_segment(self, next_id: int, ts: float) -> Path:
+        """Last segment, or a new one if it is full or from another UTC day."""
+        segs = self.segments()
+        if segs:
+            last = segs[-1]
+            same_day = last.stem.rsplit("-", 1)[-1] == time.strftime("%Y%m%d", time.gmtime(ts))
+            if same_day and last.stat().st_size < self.segment_max_bytes:
+                return last
+        return self._segment_path(next_id, ts)
+
+    # ---- writes ----
+
+    def append_many(self, events: List[Dict[str, Any]]) -> List[int]:
+        if not events:
+            return []
+        with self._locked():
+            state = self._state()
+            next_id = max(self._last_id(), int(state.get("seq", 0))) + 1
+            events = [dict(e, id=next_id + i) for i, e in enumerate(events)]
+            # one segment per UTC day of the events themselves (not of the batch's first event), so a
+            # migration or a batch flushed after midnight never files newer events under an older day
+            for run in _day_runs(events):
+                lines = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in run)
+                # single write() on an O_APPEND handle: no read-modify-write, no rewrite
+                with open(self._active_segment(run[0]["id"], run[0]["ts"]), "a", encoding="utf-8") as f:
+                    f.write(lines)
+            by_type = state.setdefault("by_type", {})
+            for e in events:
+                by_type[e["event"]] = by_type.get(e["event"], 0) + 1
+            state["seq"] = events[-1]["id"]
+            self._write_state(state)
+            self.rollup_dir.mkdir(exist_ok=True)
+            delta = {"r": [[g, b, e, n] for (g, b, e), n in _rollups(events).items()],
+                     "f": [[*k, n, t] for k, (n, t) in _facets(events).items()]}
+            pending = self._pending_paths()
+            with open(pending[-1] if pending else self.rollup_dir / f"pending-{next_id:012d}.jsonl", "a",
+                      encoding="utf-8") as f:
+                f.write(json.dumps(delta, ensure_ascii=False, separators=(",", ":")) + "\n")
+                size = f.tell()
+            if size >= ROLLUP_PENDING_MAX_BYTES:
+                self._fold_pending()
+        return [e["id"] for e in events]
+
+    def _last_id(self) -> int:
+        """Id of the last complete line, read backwards from the end of the newest segment."""
+        segs = self.segments()
+        for e in _read_lines_reversed(segs[-1]) if segs else ():
+            return int(e.get("id") or 0)
+        return 0
+
+    # ---- reads ----
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """Reads backwards from the end of the newest segments: cost depends on n, not on history size."""
+        out: List[Dict[str, Any]] = []
+        for seg in reversed(self.segments()):
+            for e in _read_lines_reversed(seg):
+                if len(out) >= n:
+                    return out
+                out.append(e)
+        return out
+
+    def iter_events(self, after_id: int = 0) -> Iterator[Dict[str, Any]]:
+        segs = self.segments()
+        for i, seg in enumerate(segs):
+            # skip whole segments that end before after_id (next segment starts at or below it)
+            if after_id and i + 1 < len(segs) and _segment_first_id(segs[i + 1]) <= after_id + 1:
+                continue
+            for e in _read_lines(seg):
+                if e.get("id", 0) > after_id:
+                    yield e
+
+    def version(self) -> Tuple[Any, ...]:
+        segs = self.segments()
+        first = segs[0].name if segs else ""
+        return (first, max(int(self._state().get("seq", 0)), self._last_id()))
+
+    def counts(self) -> Tuple[Dict[str, int], int]:
+        by_type = self._state().get("by_type", {})
+        return by_type, sum(by_type.values())
+
+    def rollup(self, grain: str, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[int, str, int]]:
+        lo, hi = _bucket_range(grain, since, until)
+        if grain == "day":
+            files = [self.rollup_dir / "days.json"]
+        elif since is not None:
+            # one file per UTC day in range; never touches days outside it
+            end = min(hi, int(time.time()))
+            files = [self.rollup_dir / f"{_day_name(d)}.json" for d in range(lo // 86400 * 86400, end + 1, 86400)]
+        else:
+            files = sorted(p for p in self.rollup_dir.glob("????-??-??.json"))
+        totals: Dict[Tuple[int, str], int] = {}
+        for p in files:
+            for b, by_type in _read_json(p).get(grain, {}).items():
+                if lo <= int(b) <= hi:
+                    for e, n in by_type.items():
+                        totals[(int(b), e)] = totals.get((int(b), e), 0) + n
+        for (g, b, e), n in self._pending()[0].items():
+            if g == grain and lo <= b <= hi:
+                totals[(b, e)] = totals.get((b, e), 0) + n
+        return sorted((b, e, n) for (b, e), n in totals.items())
+
+    def _facet_groups(self, event_type, by, metric, since, until):
+        groups: Dict[str, List[float]] = {}
+        pending: Dict[str, Any] = {}
+        if since is None and until is None:
+            index = self._alltime_facets()
+            _groups_from_tree(groups, index.get("facets", {}), event_type, by, metric or "")
+            for p in self.rollup_dir.glob("????-??-??.json"):
+                if p.stem > index.get("through", ""):
+                    _groups_from_tree(groups, _read_json(p).get("facets", {}), event_type, by, metric or "")
+            _merge_facet_tree(pending, self._pending()[1].items())
+            _groups_from_tree(groups, pending, event_type, by, metric or "")
+            return groups
+        lo = _day_name(since) if since is not None else ""
+        hi = _day_name(until) if until is not None else "9999"
+        for p in self.rollup_dir.glob("????-??-??.json"):
+            if lo <= p.stem <= hi:
+                _groups_from_tree(groups, _read_json(p).get("facets", {}), event_type, by, metric or "")
+        _merge_facet_tree(pending, ((k, v) for k, v in self._pending()[1].items() if lo <= _day_name(k[0]) <= hi))
+        _groups_from_tree(groups, pending, event_type, by, metric or "")
+        return groups
+
+    def _pending_paths(self) -> List[Path]:
+        return sorted(self.rollup_dir.glob("pending-*.jsonl"))
+
+    def _pending(self):
+        """
+        (rollup rows, facet rows) appended since the last fold, in _rollups() /
+        _facets() form. Parsed totals are cached per pending file, so each read
+        only parses the lines appended since the previous one. Read-only.
+        """
+        with self._pending_lock:
+            paths = self._pending_paths()
+            self._pending_cache = {p: self._pending_cache.get(p, (0, {}, {})) for p in paths}
+            for p in paths:
+                offset, rows, facets = self._pending_cache[p]
+                try:
+                    with open(p, "rb") as f:
+                        f.seek(offset)
+                        chunk = f.read()
+                except FileNotFoundError:
+                    continue  # folded while we were listing
+                chunk = chunk[:chunk.rfind(b"\n") + 1]  # complete lines only
+                for line in chunk.splitlines():
+                    try:
+                        delta = json.loads(line)
+                    except Exception:
+                        continue  # torn line after a crash
+                    for g, b, e, n in delta.get("r", []):
+                        rows[(g, b, e)] = rows.get((g, b, e), 0) + n
+                    for d, e, k, v, m, n, t in delta.get("f", []):
+                        acc = facets.setdefault((d, e, k, v, m), [0, 0.0])
+                        acc[0] += n
+                        acc[1] += t
+                self._pending_cache[p] = (offset + len(chunk), rows, facets)
+            if len(paths) == 1:
+                _o, rows, facets = self._pending_cache[paths[0]]
+                return dict(rows), dict(facets)  # later reads keep adding to the cached ones
+            rows, facets = {}, {}
+            for _o, r, f in self._pending_cache.values():
+                for k, n in r.items():
+                    rows[k] = rows.get(k, 0) + n
+                for k, (n, t) in f.items():
+                    acc = facets.setdefault(k, [0, 0.0])
+                    acc[0] += n
+                    acc[1] += t
+            return rows, facets
+
+    def _fold_pending(self):
+        """Merge the pending deltas into the per-day files and start a new log (caller holds the lock)."""
+        paths = self._pending_paths()
+        rows, facets = self._pending()
+        self._merge_rollups(rows, facets)
+        through = _read_json(self.facets_path).get("through")
+        if through and facets and min(_day_name(k[0]) for k in facets) <= through:
+            # late events for a day already in the all-time index (a migration, a batch flushed after midnight)
+            self.facets_path.unlink(missing_ok=True)
+        for p in paths:
+            p.unlink(missing_ok=True)
+
+    def _alltime_facets(self) -> Dict[str, Any]:
+        """
+        {"through": last day folded in, "facets": tree} from rollups/facets.json,
+        after folding in any finished UTC day not yet in it (once per day).
+        """
+        index = _read_json(self.facets_path)
+        today = _day_name(time.time())
+        if any(index.get("through", "") < p.stem < today for p in self.rollup_dir.glob("????-??-??.json")):
+            with self._locked():
+                index = _read_json(self.facets_path)
+                through = index.get("through", "")
+                tree = index.get("facets", {})
+                for p in sorted(self.rollup_dir.glob("????-??-??.json")):
+                    if through < p.stem < today:
+                        _add_facet_tree(tree, _read_json(p).get("facets", {}))
+                        index["through"] = p.stem
+                index["facets"] = tree
+                _write_json(self.facets_path, index)
+        return index
+
+    # ---- maintenance ----
+
+    def compact(self, retention_days: float = ANALYTICS_RETENTION_DAYS,
+                minute_retention_days: float = ANALYTICS_MINUTE_RETENTION_DAYS) -> Dict[str, int]:
+        """
+        Delete sealed segments whose events are all older than 'retention_days'
+        and drop minute buckets older than 'minute_retention_days'. Their events
+        are already folded into counters and hour/day rollups, which are kept.
+        A segment's name only gives the day of its first event (segments written
+        before appends were split by day can span many), so its newest event
+        decides. The active segment is never deleted. 0 disables either limit.
+        """
+        now = time.time()
+        out = {"segments": 0, "events": 0, "minute_days": 0}
+        with self._locked():
+            self._fold_pending()
+            if retention_days > 0:
+                cutoff = time.strftime("%Y%m%d", time.gmtime(now - retention_days * 86400))
+                cutoff_ts = int((now - retention_days * 86400) // 86400 * 86400)
+                state = self._state()
+                folded = state.setdefault("compacted", {})
+                for seg in self.segments()[:-1]:
+                    if seg.stem.rsplit("-", 1)[-1] >= cutoff:
+                        continue
+                    events = list(_read_lines(seg))
+                    if any(e.get("ts", 0) >= cutoff_ts for e in events):
+                        continue
+                    by_type, n = _count(events)
+                    for k, v in by_type.items():
+                        folded[k] = folded.get(k, 0) + v
+                    seg.unlink()
+                    out["segments"] += 1
+                    out["events"] += n
+                if out["segments"]:
+                    self._write_state(state)
+            if minute_retention_days > 0:
+                cutoff_day = _day_name(now - minute_retention_days * 86400)
+                for p in self.rollup_dir.glob("????-??-??.json"):
+                    if p.stem < cutoff_day:
+                        obj = _read_json(p)
+                        if obj.pop("minute", None) is not None:
+                            _write_json(p, obj)
+                            out["minute_days"] += 1
+        return out
+
+    def rebuild_aggregates(self):
+        """
+        Recompute counters, rollups and facets from the raw segments (upgrade
+        from an older store, or repair). History already removed by compact()
+        is kept as-is from its folded totals and per-day files.
+        """
+        with self._locked():
+            self._rebuild_aggregates()
+
+    def _rebuild_aggregates(self):
+        self.rollup_dir.mkdir(exist_ok=True)
+        self._fold_pending()  # complete the per-day files of compacted days; raw days are recomputed below
+        state = self._state()
+        by_type = dict(state.get("compacted", {}))
+        for k, n in _count(self.iter_events())[0].items():
+            by_type[k] = by_type.get(k, 0) + n
+        rows = _rollups(self.iter_events())
+        raw_days = {_day_name(b) for (g, b, _e) in rows if g == "day"}
+        self.rollup_dir.mkdir(exist_ok=True)
+        for day in raw_days:
+            (self.rollup_dir / f"{day}.json").unlink(missing_ok=True)
+        daily = _read_json(self.rollup_dir / "days.json")
+        daily["day"] = {b: v for b, v in daily.get("day", {}).items() if _day_name(int(b)) not in raw_days}
+        _write_json(self.rollup_dir / "days.json", daily)
+        self._merge_rollups(rows, _facets(self.iter_events()))
+        # per-day facet files are never compacted: the all-time index is refolded from them on read
+        self.facets_path.unlink(missing_ok=True)
+        state.pop("facets", None)
+        state.update(by_type=by_type, seq=max(self._last_id(), int(state.get("seq", 0))), facet_index=1)
+        self._write_state(state)
+
+    def _state(self) -> Dict[str, Any]:
+        return _read_json(self.counters_path)
+
+    def _write_state(self, state: Dict[str, Any]):
+        state["total"] = sum(state.get("by_type", {}).values())
+        _write_json(self.counters_path, state)
+
+    def _merge_rollups(self, rows: Dict[Tuple[str, int, str], int], facets=None):
+        self.rollup_dir.mkdir(exist_ok=True)
+        files: Dict[str, Dict[str, Any]] = {}
+
+        def load(name: str) -> Dict[str, Any]:
+            if name not in files:
+                files[name] = _read_json(self.rollup_dir / f"{name}.json")
+            return files[name]
+
+        for (grain, bucket, event), n in rows.items():
+            name = "days" if grain == "day" else _day_name(bucket)
+            by_type = load(name).setdefault(grain, {}).setdefault(str(bucket), {})
+            by_type[event] = by_type.get(event, 0) + n
+        for day in {k[0] for k in (facets or {})}:
+            _merge_facet_tree(load(_day_name(day)).setdefault("facets", {}), facets.items(), day=day)
+        for name, obj in files.items():
+            _write_json(self.rollup_dir / f"{name}.json", obj)
+
+def _day_runs(events: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    """Consecutive runs of 'events' that fall on the same UTC day."""
+    run: List[Dict[str, Any]] = []
+    for e in events:
+        if run and int(e["ts"] // 86400) != int(run[-1]["ts"] // 86400):
+            yield run
+            run = []
+        run.append(e)
+    if run:
+        yield run
+
+def _segment_first_id(path: Path) -> int:
+    return int(path.stem.split("-")[1])
+
+def _read_lines(path: Path) -> Iterator[Dict[str, Any]]:
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return  # compacted away while we were listing
+    with f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except Exception:
+                # torn last line after a crash; skip it
+                continue
+
+def _read_lines_reversed(path: Path, block: int = 8192) -> Iterator[Dict[str, Any]]:
+    """Parsed lines of 'path', last first, read in blocks seeking back from the end."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        carry = b""  # partial first line of the block read before
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start) + carry
+            pos = start
+            lines = chunk.split(b"\n")
+            carry = lines.pop(0) if pos > 0 else b""
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except Exception:
+                    continue  # torn line after a crash
+        if carry.strip():
+            try:
+                yield json.loads(carry)
+            except Exception:
+                pass
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def _write_json(path: Path, obj: Dict[str, Any]):
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+class SqliteEventStore(EventStore):
+    """
+    Local SQLite database in WAL mode; one connection per thread.
+    Each batch runs in one BEGIN IMMEDIATE transaction (SQLite's single
+    writer lock), which also bumps the counters and rollups tables.
+    Ids come from the AUTOINCREMENT key and are never reused.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._write() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts      REAL NOT NULL,
+                    event   TEXT NOT NULL,
+                    payload TEXT NOT NULL DEFAULT '{}'
+                )""")
+            con.execute("CREATE INDEX IF NOT EXISTS events_ts ON events (ts)")
+            con.execute("CREATE INDEX IF NOT EXISTS events_event_ts ON events (event, ts)")
+            con.execute("CREATE TABLE IF NOT EXISTS counters (event TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    grain  TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    event  TEXT NOT NULL,
+                    n      INTEGER NOT NULL,
+                    PRIMARY KEY (grain, bucket, event)
+                ) WITHOUT ROWID""")
+            if con.execute("SELECT NOT EXISTS (SELECT 1 FROM counters) AND EXISTS (SELECT 1 FROM events)").fetchone()[0]:
+                con.execute("INSERT INTO counters (event, n) SELECT event, COUNT(*) FROM events GROUP BY event")
+            if con.execute("SELECT NOT EXISTS (SELECT 1 FROM rollups) AND EXISTS (SELECT 1 FROM events)").fetchone()[0]:
+                for grain, size in GRAINS.items():
+                    con.execute(
+                        "INSERT INTO rollups (grain, bucket, event, n) "
+                        "SELECT ?, CAST(ts / ? AS INTEGER) * ?, event, COUNT(*) FROM events GROUP BY 2, 3",
+                        (grain, size, size),
+                    )
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS facets (
+                    event  TEXT NOT NULL,
+                    key    TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    day    INTEGER NOT NULL,
+                    value  TEXT NOT NULL,
+                    n      INTEGER NOT NULL,
+                    total  REAL NOT NULL,
+                    PRIMARY KEY (event, key, metric, day, value)
+                ) WITHOUT ROWID""")
+            # user_version 1 = facets backfilled (they can't be derived in SQL alone)
+            if con.execute("PRAGMA user_version").fetchone()[0] < 1:
+                self._upsert_facets(con, _facets(self.iter_events()))
+                con.execute("PRAGMA user_version = 1")
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            # only takes effect on a new database; lets compact() hand pages back to the OS
+            con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def _write(self):
+        """BEGIN IMMEDIATE ... COMMIT, or ROLLBACK on error (explicit, since autocommit is on)."""
+        con = self._conn()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def append_many(self, events: List[Dict[str, Any]]) -> List[int]:
+        if not events:
+            return []
+        by_type, _ = _count(events)
+        with self._write() as con:
+            ids = []
+            for e in events:
+                cur = con.execute(
+                    "INSERT INTO events (ts, event, payload) VALUES (?, ?, ?)",
+                    (e["ts"], e["event"], json.dumps(e.get("payload") or {}, ensure_ascii=False)),
+                )
+                ids.append(cur.lastrowid)
+            con.executemany(
+                "INSERT INTO counters (event, n) VALUES (?, ?) ON CONFLICT(event) DO UPDATE SET n = n + excluded.n",
+                list(by_type.items()),
+            )
+            con.executemany(
+                "INSERT INTO rollups (grain, bucket, event, n) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(grain, bucket, event) DO UPDATE SET n = n + excluded.n",
+                [(g, b, e, n) for (g, b, e), n in _rollups(events).items()],
+            )
+            self._upsert_facets(con, _facets(events))
+        return ids
+
+    @staticmethod
+    def _upsert_facets(con: sqlite3.Connection, facets):
+        con.executemany(
+            "INSERT INTO facets (event, key, metric, day, value, n, total) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(event, key, metric, day, value) DO UPDATE SET n = n + excluded.n, total = total + excluded.total",
+            [(e, k, m, d, v, n, t) for (d, e, k, v, m), (n, t) in facets.items()],
+        )
+
+    def iter_events(self, after_id: int = 0) -> Iterator[Dict[str, Any]]:
+        cur = self._conn().execute("SELECT id, ts, event, payload FROM events WHERE id > ? ORDER BY id", (after_id,))
+        for id_, ts, event, payload in cur:
+            yield {"id": id_, "ts": ts, "event": event, "payload": json.loads(payload or "{}")}
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        cur = self._conn().execute("SELECT id, ts, event, payload FROM events ORDER BY id DESC LIMIT ?", (max(0, n),))
+        return [{"id": i, "ts": ts, "event": e, "payload": json.loads(p or "{}")} for i, ts, e, p in cur]
+
+    def version(self) -> Tuple[Any, ...]:
+        # two subqueries: a combined MIN/MAX is not answered from the index and scans the table
+        lo, hi = self._conn().execute("SELECT (SELECT MIN(id) FROM events), (SELECT MAX(id) FROM events)").fetchone()
+        return (lo or 0, hi or 0)
+
+    def counts(self) -> Tuple[Dict[str, int], int]:
+        by_type = dict(self._conn().execute("SELECT event, n FROM counters"))
+        return by_type, sum(by_type.values())
+
+    def rollup(self, grain: str, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[int, str, int]]:
+        lo, hi = _bucket_range(grain, since, until)
+        cur = self._conn().execute(
+            "SELECT bucket, event, n FROM rollups WHERE grain = ? AND bucket BETWEEN ? AND ? ORDER BY bucket, event",
+            (grain, lo, hi),
+        )
+        return cur.fetchall()
+
+    def select(self, event_type: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+               where: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Same as EventStore.select(), in SQL: (event, ts) / ts indexes first, then json_extract on payloads."""
+        sql, args = ["SELECT id, ts, event, payload FROM events WHERE 1"], []
+        if event_type is not None:
+            sql.append("AND event = ?")
+            args.append(event_type)
+        if since is not None:
+            sql.append("AND ts >= ?")
+            args.append(since)
+        if until is not None:
+            sql.append("AND ts <= ?")
+            args.append(until)
+        for k, v in (where or {}).items():
+            if not _KEY_RE.fullmatch(k):
+                raise ValueError(f"Unsupported payload key: {k!r}")
+            sql.append(f"AND json_extract(payload, '$.{k}') = ?")
+            args.append(v)
+        sql.append("ORDER BY id DESC")
+        if limit is not None:
+            sql.append("LIMIT ?")
+            args.append(max(0, int(limit)))
+        cur = self._conn().execute(" ".join(sql), args)
+        return [{"id": i, "ts": ts, "event": e, "payload": json.loads(p or "{}")} for i, ts, e, p in cur]
+
+    def _facet_groups(self, event_type, by, metric, since, until):
+        lo, hi = _bucket_range("day", since, until)
+        cur = self._conn().execute(
+            "SELECT value, metric, SUM(n), SUM(total) FROM facets "
+            "WHERE event = ? AND key = ? AND metric IN ('', ?) AND day BETWEEN ? AND ? GROUP BY value, metric",
+            (event_type, by, metric or "", lo, hi),
+        )
+        groups: Dict[str, List[float]] = {}
+        for value, m, n, total in cur:
+            g = groups.setdefault(value, [0, 0, 0.0])
+            if m == "":
+                g[0] += n
+            if metric and m == metric:
+                g[1] += n
+                g[2] += total
+        return groups
+
+    def compact(self, retention_days: float = ANALYTICS_RETENTION_DAYS,
+                minute_retention_days: float = ANALYTICS_MINUTE_RETENTION_DAYS) -> Dict[str, int]:
+        """
+        Delete raw events older than 'retention_days' and minute buckets older
+        than 'minute_retention_days' (0 disables either). Counters, hour/day
+        rollups and facets already include those events and are kept. Deletes run in
+        small transactions so writers are never blocked for long.
+        """
+        now = time.time()
+        out = {"events": 0, "minute_buckets": 0}
+        if retention_days > 0:
+            cutoff = now - retention_days * 86400
+            while True:
+                with self._write() as con:
+                    n = con.execute(
+                        "DELETE FROM events WHERE id IN (SELECT id FROM events WHERE ts < ? ORDER BY id LIMIT 5000)",
+                        (cutoff,),
+                    ).rowcount
+                out["events"] += n
+                if n < 5000:
+                    break
+        if minute_retention_days > 0:
+            with self._write() as con:
+                out["minute_buckets"] = con.execute(
+                    "DELETE FROM rollups WHERE grain = 'minute' AND bucket < ?",
+                    (int(now - minute_retention_days * 86400),),
+                ).rowcount
+        if out["events"] or out["minute_buckets"]:
+            con = self._conn()
+            con.execute("PRAGMA incremental_vacuum")
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return out
+
+BACKENDS = {
+    "jsonl": lambda data_dir: JsonlEventStore(Path(data_dir) / "events"),
+    "sqlite": lambda data_dir: SqliteEventStore(Path(data_dir) / "analytics.db"),
+}
+
+def open_store(backend: str = ANALYTICS_BACKEND, data_dir: Path = DATA_DIR) -> EventStore:
+    factory = BACKENDS.get(backend)
+    if factory is None:
+        raise RuntimeError(f"Unknown ANALYTICS_BACKEND '{backend}'. Use one of: {', '.join(BACKENDS)}")
+    return factory(data_dir)
+
+# --------------------- Legacy migration ---------------------
+
+def migrate_legacy_log(store: EventStore, legacy: Path = LEGACY_LOG_FILE) -> int:
+    """
+    Import the old {ts: {"event", "payload"}} JSON file into 'store'.
+    The file is renamed before import so concurrent processes migrate it once;
+    if the import fails it is renamed back, so a later start retries it.
+    Records without a string "event" are skipped. Returns the number of imported events.
+    """
+    claimed = legacy.with_name(legacy.name + f".migrating-{os.getpid()}")
+    try:
+        legacy.rename(claimed)
+    except OSError:
+        return 0  # nothing to migrate, or another process got it first
+    try:
+        obj = json.loads(claimed.read_text(encoding="utf-8"))
+    except Exception:
+        obj = {}
+    fallback_ts = claimed.stat().st_mtime
+    events = []
+    for key, rec in (obj.items() if isinstance(obj, dict) else []):
+        if not isinstance(rec, dict) or not isinstance(rec.get("event"), str):
+            continue
+        try:
+            ts = float(key)
+        except Exception:
+            ts = fallback_ts
+        events.append(make_event(rec.get("event"), rec.get("payload"), ts))
+    events.sort(key=lambda e: e["ts"])  # in time order, append_many files each day in its own segment
+    try:
+        store.append_many(events)
+    except Exception:
+        log.exception("Legacy analytics migration failed; %s will be retried", legacy)
+        claimed.rename(legacy)
+        return 0
+    claimed.rename(legacy.with_name(legacy.name + ".migrated"))
+    return len(events)
+
+# --------------------- Background writer ---------------------
+
+class BufferedWriter:
+    """
+    Moves store writes off the request path. submit() only enqueues; a
+    daemon thread drains the queue into store.append_many() in batches of up
+    to 'max_batch' events, or every 'flush_interval' seconds.
+    The queue holds at most 'max_queue' events: under a burst, submit()
+    blocks briefly (backpressure) and, if the writer is still behind, writes
+    the event itself rather than growing memory or dropping it.
+    Every 'compact_every' seconds the thread also runs store.compact().
+    """
+
+    def __init__(self, store: EventStore, max_batch: int = ANALYTICS_BATCH_SIZE,
+                 flush_interval: float = ANALYTICS_FLUSH_SEC, max_queue: int = ANALYTICS_QUEUE_MAX,
+                 compact_every: float = ANALYTICS_COMPACT_EVERY_SEC):
+        self.store = store
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.compact_every = float(compact_every)
+        self._next_compact = time.monotonic()  # once soon after startup, then periodically
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, event: Dict[str, Any]):
+        if self._closed:
+            self.store.append_many([event])
+            return
+        try:
+            self._q.put(event, timeout=self.flush_interval)
+        except queue.Full:
+            self.store.append_many([event])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far is written. False on timeout."""
+        if not self._thread.is_alive():
+            return self._q.empty()
+        done = threading.Event()
+        self._q.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Flush and stop the thread (registered with atexit for the shared writer)."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            self._maybe_compact()
+            try:
+                item = self._q.get(timeout=self.compact_every if self.compact_every > 0 else None)
+            except queue.Empty:
+                continue
+            batch, markers, stop = [], [], item is None
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None:
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                    break  # flush now so the caller is released promptly
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                stop = item is None
+            self._write(batch)
+            for m in markers:
+                m.set()
+            if stop:
+                return
+
+    def _maybe_compact(self):
+        if self.compact_every <= 0 or time.monotonic() < self._next_compact:
+            return
+        self._next_compact = time.monotonic() + self.compact_every
+        try:
+            removed = self.store.compact()
+            if any(removed.values()):
+                log.info("analytics: compacted %s", removed)
+        except Exception:
+            log.exception("analytics: compaction failed")
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        for attempt in range(3):
+            try:
+                self.store.append_many(batch)
+                return
+            except Exception:
+                if attempt == 2:
+                    log.exception("analytics: dropped %d events after 3 failed writes", len(batch))
+                else:
+                    time.sleep(0.2 * (attempt + 1))
+
+# --------------------- Public API ---------------------
+
+_store: Optional[EventStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> EventStore:
+    """Process-wide store for ANALYTICS_BACKEND; migrates the legacy log on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = open_store()
+                migrate_legacy_log(store)
+                _store = store
+    return _store
+
+_writer: Optional[BufferedWriter] = None
+
+def get_writer() -> BufferedWriter:
+    """Process-wide background writer for get_store(); flushed at interpreter exit."""
+    global _writer
+    if _writer is None:
+        store = get_store()
+        with _store_lock:
+            if _writer is None:
+                _writer = BufferedWriter(store)
+                atexit.register(_writer.close)
+    return _writer
+
+def record(event_type: str, payload: Optional[Dict[str, Any]] = None):
+    """Record one event: queued for the background writer (ANALYTICS_ASYNC=1) or written inline."""
+    event = make_event(event_type, payload)
+    if ANALYTICS_ASYNC:
+        get_writer().submit(event)
+    else:
+        get_store().append_many([event])
@@ -0,0 +1,326 @@
+# core/cache.py
+#
+# Content-addressed response cache in front of core.models_groq.chat.
+# Identical requests (same model, system/user prompt, temperature and
+# json_mode) are answered locally instead of going back to Groq, e.g. the
+# preset buttons in Academic Q&A, Coding Mentor and Quiz.
+#
+# Env (set via .env or Streamlit Secrets):
+#   RESPONSE_CACHE=1                       # 0 disables the cache entirely
+#   RESPONSE_CACHE_TTL_SEC=86400           # entries older than this are misses
+#   RESPONSE_CACHE_MEM_MAX_BYTES=8388608   # in-process LRU tier size
+#   RESPONSE_CACHE_DISK_MAX_BYTES=67108864 # SQLite tier size (DATA_DIR/response_cache.db)
+#
+# Lookups go memory -> disk -> miss; a disk hit is promoted into memory.
+# Both tiers evict least-recently-used entries once they exceed their byte
+# budget. Hit/miss counters are per process: see get_cache().stats().
+#
+# SingleFlight covers the gap before an answer is cached: concurrent
+# identical requests (same key) in one server process attach to the call
+# already in flight and share its result or error, across threads, sessions
+# and event loops.
+
+import asyncio, hashlib, json, logging, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import (
+    DATA_DIR, RESPONSE_CACHE_TTL_SEC, RESPONSE_CACHE_MEM_MAX_BYTES, RESPONSE_CACHE_DISK_MAX_BYTES,
+)
+
+log = logging.getLogger(__name__)
+
+def cache_key(model: str, system_prompt: str, user_prompt: str, temperature: float, json_mode: bool) -> str:
+    """sha256 over the canonical request; any change in the inputs is a different key."""
+    raw = json.dumps([model, system_prompt, user_prompt, round(float(temperature), 4), bool(json_mode)],
+                     ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class MemoryLRU:
+    """Thread-safe LRU of key -> (created, value), bounded by the total size of the values."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes, self.ttl = max_bytes, ttl
+        self._items: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if time.time() - item[0] > self.ttl:
+                self._drop(key)
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: str, value: str, created: Optional[float] = None):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (created or time.time(), value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def discard(self, key: str):
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def _drop(self, key: str):
+        _created, value = self._items.pop(key)
+        self._bytes -= len(value.encode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+class DiskCache:
+    """
+    SQLite tier (WAL, one connection per thread), shared by every process on
+    the host. When the stored values exceed 'max_bytes', the least recently
+    used rows are deleted down to 90% of the budget.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, ttl: float):
+        self.path, self.max_bytes, self.ttl = Path(path), max_bytes, ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self.evictions = 0
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key      TEXT PRIMARY KEY,
+                value    TEXT NOT NULL,
+                size     INTEGER NOT NULL,
+                created  REAL NOT NULL,
+                accessed REAL NOT NULL
+            ) WITHOUT ROWID""")
+        self._conn().execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        con = self._conn()
+        row = con.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[0] > self.ttl:
+            con.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        con.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return row
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        con = self._conn()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            total = con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                target, freed, victims = total - int(self.max_bytes * 0.9), 0, []
+                for k, s in con.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if freed >= target:
+                        break
+                    victims.append((k,))
+                    freed += s
+                con.executemany("DELETE FROM responses WHERE key = ?", victims)
+                self.evictions += len(victims)
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def discard(self, key: str):
+        self._conn().execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+class ResponseCache:
+    """Memory LRU in front of the SQLite tier, with per-process hit/miss counters."""
+
+    def __init__(self, path: Path, mem_max_bytes: int = RESPONSE_CACHE_MEM_MAX_BYTES,
+                 disk_max_bytes: int = RESPONSE_CACHE_DISK_MAX_BYTES, ttl: float = RESPONSE_CACHE_TTL_SEC):
+        self.memory = MemoryLRU(mem_max_bytes, ttl)
+        self.disk = DiskCache(path, disk_max_bytes, ttl)
+        self._lock = threading.Lock()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._bump("memory_hits")
+            return value
+        try:
+            row = self.disk.get(key)
+        except sqlite3.Error as e:
+            log.warning("response cache read failed: %s", e)
+            self._bump("errors")
+            row = None
+        if row is not None:
+            self.memory.put(key, row[1], created=row[0])
+            self._bump("disk_hits")
+            return row[1]
+        self._bump("misses")
+        return None
+
+    def put(self, key: str, value: str):
+        if not value:
+            return  # never cache empty answers
+        self.memory.put(key, value)
+        try:
+            self.disk.put(key, value)
+        except sqlite3.Error as e:
+            log.warning("response cache write failed: %s", e)
+            self._bump("errors")
+        self._bump("stores")
+
+    def discard(self, key: str):
+        """Drop one entry from both tiers, e.g. an answer that turned out to be unusable."""
+        self.memory.discard(key)
+        try:
+            self.disk.discard(key)
+        except sqlite3.Error as e:
+            log.warning("response cache delete failed: %s", e)
+            self._bump("errors")
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counts)
+        lookups = out["memory_hits"] + out["disk_hits"] + out["misses"]
+        out["hit_rate"] = (out["memory_hits"] + out["disk_hits"]) / lookups if lookups else 0.0
+        out["memory_entries"] = len(self.memory)
+        out["evictions"] = self.memory.evictions + self.disk.evictions
+        return out
+
+    def _bump(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+class SingleFlight:
+    """
+    At most one in-flight call per key. The first caller (leader) runs it;
+    callers arriving meanwhile wait on the leader's Future. If the leader
+    gives up without a result (e.g. an abandoned stream), waiting callers
+    run the call themselves.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """(future for 'key', True if the caller is the leader and must settle() it)."""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                return fut, False
+            fut = self._calls[key] = Future()
+            return fut, True
+
+    def settle(self, key: str, fut: Future, result: Any = None, error: Optional[BaseException] = None):
+        """Leader only: publish the result (or error) to every waiting caller."""
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    def cancel(self, key: str, fut: Future):
+        """Leader only: withdraw without a result; followers fall back to their own call."""
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+        fut.cancel()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        while True:
+            fut, leader = self.join(key)
+            if leader:
+                try:
+                    result = fn()
+                except BaseException as e:
+                    self.settle(key, fut, error=e)
+                    raise
+                self.settle(key, fut, result)
+                return result
+            try:
+                return fut.result()
+            except CancelledError:
+                continue
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """asyncio version of do(); followers wait without blocking their loop."""
+        while True:
+            fut, leader = self.join(key)
+            if leader:
+                try:
+                    result = await fn()
+                except asyncio.CancelledError:
+                    self.cancel(key, fut)
+                    raise
+                except BaseException as e:
+                    self.settle(key, fut, error=e)
+                    raise
+                self.settle(key, fut, result)
+                return result
+            try:
+                # shield: cancelling this task must not cancel the leader's future
+                return await asyncio.shield(asyncio.wrap_future(fut))
+            except (CancelledError, asyncio.CancelledError):
+                if not fut.cancelled():
+                    raise  # this task itself was cancelled
+                continue
+
+# --------------------- Process-wide cache ---------------------
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(Path(DATA_DIR) / "response_cache.db")
+    return _cache
@@ -14,6 +14,72 @@ HF_SENTIMENT_MODEL      = os.getenv("HF_SENTIMENT_MODEL", "distilbert-base-uncas
 HF_EMOTION_MODEL        = os.getenv("HF_EMOTION_MODEL", "j-hartmann/emotion-english-distilroberta-base").strip()
 HF_TIMEOUT_SEC          = float(os.getenv("HF_TIMEOUT_SEC", "25"))
 
+# Analytics event store
+DATA_DIR                = os.getenv("DATA_DIR", "data").strip()
+ANALYTICS_BACKEND       = os.getenv("ANALYTICS_BACKEND", "jsonl").strip().lower()  # jsonl | sqlite
+ANALYTICS_ASYNC         = os.getenv("ANALYTICS_ASYNC", "1").strip() == "1"  # background batched writer
+ANALYTICS_BATCH_SIZE    = int(os.getenv("ANALYTICS_BATCH_SIZE", "200"))
+ANALYTICS_FLUSH_SEC     = float(os.getenv("ANALYTICS_FLUSH_SEC", "0.5"))
+ANALYTICS_QUEUE_MAX     = int(os.getenv("ANALYTICS_QUEUE_MAX", "10000"))
+ANALYTICS_SEGMENT_MAX_BYTES     = int(os.getenv("ANALYTICS_SEGMENT_MAX_BYTES", str(8 * 1024 * 1024)))
+ANALYTICS_RETENTION_DAYS        = float(os.getenv("ANALYTICS_RETENTION_DAYS", "30"))  # raw events; 0 = forever
+ANALYTICS_MINUTE_RETENTION_DAYS = float(os.getenv("ANALYTICS_MINUTE_RETENTION_DAYS", "7"))
+ANALYTICS_COMPACT_EVERY_SEC     = float(os.getenv("ANALYTICS_COMPACT_EVERY_SEC", "3600"))
+
+# Groq fan-out: default number of requests chat_many() keeps in flight
+GROQ_CONCURRENCY        = int(os.getenv("GROQ_CONCURRENCY", "4"))
+
+# Quizzes with more questions than this are generated as parallel shards of this size
+QUIZ_SHARD_SIZE         = int(os.getenv("QUIZ_SHARD_SIZE", "5"))
+QUIZ_SHARD_RETRIES      = int(os.getenv("QUIZ_SHARD_RETRIES", "2"))  # extra rounds for invalid shards
+QUIZ_BANK               = os.getenv("QUIZ_BANK", "1").strip() == "1"  # serve from the question bank (core/qbank.py) first
+QUIZ_BANK_STOCK         = int(os.getenv("QUIZ_BANK_STOCK", "3"))  # keep this many quizzes' worth of questions per topic
+QUIZ_BANK_RESTOCK_AFTER = int(os.getenv("QUIZ_BANK_RESTOCK_AFTER", "3"))  # requests before a non-preset topic is restocked
+
+# Code longer than this is reviewed as parallel chunks split at function/class boundaries
+CODE_REVIEW_CHUNK_CHARS = int(os.getenv("CODE_REVIEW_CHUNK_CHARS", "6000"))
+
+# Project review (zip / folder upload in Coding Mentor); per-file results cached by content hash
+PROJECT_REVIEW_MAX_FILES        = int(os.getenv("PROJECT_REVIEW_MAX_FILES", "300"))
+PROJECT_REVIEW_MAX_FILE_BYTES   = int(os.getenv("PROJECT_REVIEW_MAX_FILE_BYTES", str(256 * 1024)))
+PROJECT_REVIEW_CACHE_MAX_BYTES  = int(os.getenv("PROJECT_REVIEW_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Groq pacing and retries (core/ratelimit.py); Groq's rate-limit headers override RPM/TPM
+GROQ_RPM                = float(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM                = float(os.getenv("GROQ_TPM", "6000"))
+GROQ_MAX_RETRIES        = int(os.getenv("GROQ_MAX_RETRIES", "5"))
+GROQ_BACKOFF_BASE_SEC   = float(os.getenv("GROQ_BACKOFF_BASE_SEC", "0.5"))
+GROQ_BACKOFF_MAX_SEC    = float(os.getenv("GROQ_BACKOFF_MAX_SEC", "20"))
+GROQ_DEADLINE_SEC       = float(os.getenv("GROQ_DEADLINE_SEC", "60"))
+
+# Model routing and hedged requests (core/router.py); empty GROQ_MODELS = just GROQ_MODEL (no routing/hedging)
+GROQ_MODELS             = os.getenv("GROQ_MODELS", "").strip()
+GROQ_LATENCY_BUDGETS    = os.getenv("GROQ_LATENCY_BUDGETS", "").strip()   # e.g. "qna=6,quiz=30" (seconds)
+GROQ_HEDGE              = os.getenv("GROQ_HEDGE", "0").strip() == "1"  # opt-in
+GROQ_HEDGE_MIN_SAMPLES  = int(os.getenv("GROQ_HEDGE_MIN_SAMPLES", "20"))
+
+# Preset prewarm job (core/prewarm.py)
+PREWARM                 = os.getenv("PREWARM", "1").strip() == "1"
+PREWARM_CONCURRENCY     = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+PREWARM_EVERY_SEC       = float(os.getenv("PREWARM_EVERY_SEC", "43200"))  # 0 = startup only
+
+# LLM response cache (core/cache.py)
+RESPONSE_CACHE                  = os.getenv("RESPONSE_CACHE", "1").strip() == "1"
+RESPONSE_CACHE_TTL_SEC          = float(os.getenv("RESPONSE_CACHE_TTL_SEC", "86400"))
+RESPONSE_CACHE_MEM_MAX_BYTES    = int(os.getenv("RESPONSE_CACHE_MEM_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_DISK_MAX_BYTES   = int(os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Semantic cache for near-duplicate Academic Q&A questions (core/semcache.py)
+SEMANTIC_CACHE                  = os.getenv("SEMANTIC_CACHE", "1").strip() == "1"
+SEMANTIC_CACHE_THRESHOLD        = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))  # cosine similarity
+SEMANTIC_CACHE_CAPACITY         = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "2000"))
+SEMANTIC_CACHE_EVICTION         = os.getenv("SEMANTIC_CACHE_EVICTION", "lru").strip().lower()  # lru | lfu | fifo
+SEMANTIC_CACHE_TTL_SEC          = float(os.getenv("SEMANTIC_CACHE_TTL_SEC", "86400"))
+
+# Multi-turn Academic Q&A (modules/qa.py): hard cap on the conversation context sent with each question
+QA_CONTEXT_TOKENS               = int(os.getenv("QA_CONTEXT_TOKENS", "1500"))  # summary + recent turns
+QA_SUMMARY_TOKENS               = int(os.getenv("QA_SUMMARY_TOKENS", "300"))   # rolling summary of older turns
+
 # UI palette
 PALETTE = {
     "bg": "#0b1220",
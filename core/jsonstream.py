@@ -0,0 +1,80 @@
+# core/jsonstream.py
+#
+# Incremental parser for the list-shaped JSON the app asks Groq for, e.g.
+#   {"topic": "...", "questions": [{...}, {...}]}   (quiz)
+#   {"topic": "...", "cards": [{...}, {...}]}       (flashcards)
+# Fed the completion piece by piece as it streams in, it hands back each
+# element of the chosen top-level array as soon as that element's closing
+# brace arrives, so a page can show the first question long before the
+# last token. Anything before the first '{' (prose, a ```json fence) is
+# skipped; an element that does not parse on its own is dropped.
+
+import json
+from typing import Any, List, Optional
+
+class JsonItemStream:
+    """
+    s = JsonItemStream("questions")
+    for piece in chat_stream(...):
+        for item in s.feed(piece): ...
+    s.text is everything fed so far, i.e. the raw completion.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ""
+        self.done = False               # the array (or the whole object) has closed
+        self._pos = 0                   # next character of self.text to scan
+        self._depth = 0                 # nesting inside the top-level object; 0 = not in it yet
+        self._in_str = self._esc = False
+        self._str_start = 0
+        self._last_key: Optional[str] = None  # last string seen directly inside the top-level object
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Append 'chunk'; returns the array elements it completed, in order."""
+        self.text += chunk
+        items: List[Any] = []
+        text, i, end = self.text, self._pos, len(self.text)
+        while i < end and not self.done:
+            c = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        self._last_key = text[self._str_start + 1:i]
+            elif self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+            elif c == '"':
+                self._in_str, self._str_start = True, i
+            elif c in "{[":
+                self._depth += 1
+                if self._array_depth is None:
+                    if c == "[" and self._depth == 2 and self._last_key == self.key:
+                        self._array_depth = 2
+                elif self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif c in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if self._item_start is not None and self._depth == self._array_depth:
+                        try:
+                            items.append(json.loads(text[self._item_start:i + 1]))
+                        except ValueError:
+                            pass
+                        self._item_start = None
+                    elif self._depth < self._array_depth:
+                        self.done = True
+                if self._depth <= 0:
+                    self.done = True
+            elif c == "," and self._depth == 1:
+                self._last_key = None
+            i += 1
+        self._pos = i
+        return items
@@ -1,34 +1,336 @@
-from typing import Optional, List, Dict, Any
-from groq import Groq
-from .config import GROQ_API_KEY, GROQ_MODEL
+import asyncio, json, logging, re, sqlite3, threading, time, weakref
+from concurrent.futures import CancelledError
+from typing import Optional, List, Dict, Any, Iterator, Sequence, Tuple, Union
+from groq import AsyncGroq, Groq
+from .cache import SingleFlight, cache_key, get_cache
+from .jsonstream import JsonItemStream
+from .qbank import fingerprint, get_bank, normalize
+from .config import (
+    GROQ_API_KEY, GROQ_MODEL, GROQ_CONCURRENCY, GROQ_DEADLINE_SEC, RESPONSE_CACHE, QUIZ_SHARD_SIZE, QUIZ_SHARD_RETRIES,
+    QUIZ_BANK, QUIZ_BANK_STOCK, QUIZ_BANK_RESTOCK_AFTER,
+)
+from .presets import QUIZ_PRESETS
+from .ratelimit import acall_with_retries, call_with_retries, estimate_tokens, get_limiter
+from .router import get_router
+from .telemetry import get_telemetry
+
+log = logging.getLogger(__name__)
 
 _client: Optional[Groq] = None
+# AsyncGroq's connection pool belongs to the loop that opened it, so one client per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGroq]" = weakref.WeakKeyDictionary()
+
+# chat_many() runs on one long-lived loop thread, so its AsyncGroq client (and connection pool) is reused
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+# identical requests in flight in this process share one Groq call (keyed like the cache)
+_inflight = SingleFlight()
+
+# chat_many() item: (system_prompt, user_prompt) or a dict of chat() keyword arguments
+ChatRequest = Union[Tuple[str, str], Dict[str, Any]]
 
 def _get_client() -> Groq:
     global _client
     if _client is None:
         if not GROQ_API_KEY:
             raise RuntimeError("GROQ_API_KEY is missing. Put it in .env")
-        _client = Groq(api_key=GROQ_API_KEY)
+        # retries and pacing are ours (core/ratelimit.py), not the SDK's
+        _client = Groq(api_key=GROQ_API_KEY, max_retries=0)
     return _client
 
-def chat(system_prompt: str, user_prompt: str, json_mode: bool=False, temperature: float=0.2) -> str:
-    client = _get_client()
-    resp = client.chat.completions.create(
-        model=GROQ_MODEL,
+def _get_async_client() -> AsyncGroq:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if not GROQ_API_KEY:
+            raise RuntimeError("GROQ_API_KEY is missing. Put it in .env")
+        client = _async_clients[loop] = AsyncGroq(api_key=GROQ_API_KEY, max_retries=0)
+    return client
+
+def model_key() -> str:
+    """
+    The models an answer may come from: GROQ_MODEL, or every GROQ_MODELS
+    candidate when routing. Part of every cache key, so after the model
+    configuration changes no answer from another model is served.
+    """
+    return ",".join(get_router().models)
+
+def _lookup(system_prompt: str, user_prompt: str, json_mode: bool, temperature: float,
+            cache: bool) -> Tuple[str, Optional[str]]:
+    """(request key, cached answer or None); the cache is skipped when cache=False or RESPONSE_CACHE=0."""
+    key = cache_key(model_key(), system_prompt, user_prompt, temperature, json_mode)
+    return key, get_cache().get(key) if cache and RESPONSE_CACHE else None
+
+def _store(key: str, out: Optional[str], cache: bool):
+    if cache and RESPONSE_CACHE and out:
+        get_cache().put(key, out)
+
+def forget(system_prompt: str, user_prompt: str, json_mode: bool=False, temperature: float=0.2):
+    """Drop a cached answer (e.g. one that failed validation) so the next identical call asks Groq again."""
+    if RESPONSE_CACHE:
+        get_cache().discard(cache_key(model_key(), system_prompt, user_prompt, temperature, json_mode))
+
+def _request(system_prompt: str, user_prompt: str, json_mode: bool, temperature: float, model: Optional[str]=None,
+             **extra) -> Dict[str, Any]:
+    return dict(
+        model=model or GROQ_MODEL,
         temperature=temperature,
         messages=[
             {"role":"system", "content": system_prompt},
             {"role":"user", "content": user_prompt}
         ],
-        response_format={"type":"json_object"} if json_mode else None
+        response_format={"type":"json_object"} if json_mode else None,
+        **extra
     )
-    return resp.choices[0].message.content
 
-def generate_quiz(topic: str, n_questions: int=5, difficulty: str="easy") -> Dict[str, Any]:
-    system = "You are a strict quiz generator. Always return valid JSON exactly matching the schema."
-    user = f"""
-Create a multiple-choice quiz on "{topic}" with {n_questions} questions (difficulty: {difficulty}).
+def _record(feature: str, started: float, outcome: str="ok", timing: Optional[Dict[str, float]]=None,
+            usage: Any=None, model: str=GROQ_MODEL):
+    """Report one chat call to core/telemetry.py; 'started' is its time.monotonic() start."""
+    get_telemetry().record(
+        "groq", feature, model, time.monotonic() - started, (timing or {}).get("queue", 0.0),
+        getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None), outcome,
+    )
+
+def _slowest(timings: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """Timing to report for a failed (possibly hedged) call: the attempt that queued longest."""
+    return max(timings.values(), key=lambda t: t.get("queue", 0.0), default={})
+
+def chat(system_prompt: str, user_prompt: str, json_mode: bool=False, temperature: float=0.2,
+         cache: bool=True, deadline: float=GROQ_DEADLINE_SEC, feature: str="other") -> str:
+    """
+    One chat completion. Identical requests are served from the response
+    cache (core/cache.py); cache=False always calls Groq and does not store.
+    Identical requests already in flight in this process are joined rather
+    than sent again. Calls are paced by the shared rate limiter and retried
+    on 429/5xx until 'deadline' seconds have passed (core/ratelimit.py).
+    The model is picked per 'feature' by core/router.py, which also hedges a
+    slow request to a second model. Latency and tokens are recorded under
+    'feature' (core/telemetry.py). Cached answers are keyed by the configured
+    model set (model_key()), so they are shared between routed models but
+    never survive a change of GROQ_MODEL / GROQ_MODELS.
+    """
+    started = time.monotonic()
+    key, hit = _lookup(system_prompt, user_prompt, json_mode, temperature, cache)
+    if hit is not None:
+        _record(feature, started, "cached")
+        return hit
+    led = []
+
+    def call() -> str:
+        led.append(True)
+        client = _get_client()
+        timings: Dict[str, Dict[str, float]] = {}
+
+        def send(model: str, on_send):
+            req = _request(system_prompt, user_prompt, json_mode, temperature, model)
+            return call_with_retries(
+                lambda timeout: client.chat.completions.with_raw_response.create(**req, timeout=timeout),
+                estimate_tokens(system_prompt, user_prompt), deadline, timing=timings.setdefault(model, {}),
+                on_send=on_send,
+            )
+
+        try:
+            model, resp = get_router().call(send, feature)
+        except Exception:
+            _record(feature, started, "error", _slowest(timings))
+            raise
+        _record(feature, started, "ok", timings.get(model), resp.usage, model)
+        out = resp.choices[0].message.content
+        _store(key, out, cache)
+        return out
+
+    out = _inflight.do(key, call)
+    if not led:
+        _record(feature, started, "coalesced")
+    return out
+
+def chat_stream(system_prompt: str, user_prompt: str, json_mode: bool=False, temperature: float=0.2,
+                cache: bool=True, deadline: float=GROQ_DEADLINE_SEC, feature: str="other") -> Iterator[str]:
+    """
+    Same request as chat(), but yields the answer in pieces as Groq produces them.
+    Nothing is sent until iteration starts. A cached answer is yielded in one
+    piece; a completed stream is cached under the same key as chat().
+    A caller that joins an identical request already in flight receives the
+    whole answer in one piece when it completes.
+    Opening the stream is paced and retried like chat(); once text has
+    arrived, errors are raised to the caller. Wall time is recorded when the
+    stream ends, with the token usage Groq sends in its last chunk.
+    The model is routed like chat(); the hedge fires when the first chunk
+    is late, and the stream that starts first is the one read.
+    """
+    started = time.monotonic()
+    key, hit = _lookup(system_prompt, user_prompt, json_mode, temperature, cache)
+    if hit is not None:
+        _record(feature, started, "cached")
+        yield hit
+        return
+    while True:
+        fut, leader = _inflight.join(key)
+        if leader:
+            break
+        try:
+            text = fut.result()
+        except CancelledError:
+            continue  # that stream was abandoned; try again
+        _record(feature, started, "coalesced")
+        yield text
+        return
+    timings: Dict[str, Dict[str, float]] = {}
+    usage = chunks = None
+
+    def open_stream(model: str, on_send):
+        req = _request(system_prompt, user_prompt, json_mode, temperature, model, stream=True)
+        return call_with_retries(
+            lambda timeout: client.chat.completions.with_raw_response.create(**req, timeout=timeout),
+            estimate_tokens(system_prompt, user_prompt), deadline, timing=timings.setdefault(model, {}),
+            on_send=on_send,
+        )
+
+    try:
+        client = _get_client()
+        model, chunks = get_router().stream(open_stream, feature)
+        parts = []
+        for chunk in chunks:
+            x_groq = getattr(chunk, "x_groq", None)
+            usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None) or usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+    except GeneratorExit:
+        if chunks is not None:
+            chunks.close()
+        _inflight.cancel(key, fut)  # the page stopped reading; nothing to share
+        raise
+    except BaseException as e:
+        _record(feature, started, "error", _slowest(timings))
+        _inflight.settle(key, fut, error=e)
+        raise
+    _record(feature, started, "ok", timings.get(model), usage, model)
+    out = "".join(parts)
+    _store(key, out, cache)
+    _inflight.settle(key, fut, out)
+
+async def achat(system_prompt: str, user_prompt: str, json_mode: bool=False, temperature: float=0.2,
+                cache: bool=True, deadline: float=GROQ_DEADLINE_SEC, feature: str="other") -> str:
+    """asyncio version of chat(), on a per-loop AsyncGroq client and the same limiter, in-flight table and telemetry."""
+    started = time.monotonic()
+    key, hit = _lookup(system_prompt, user_prompt, json_mode, temperature, cache)
+    if hit is not None:
+        _record(feature, started, "cached")
+        return hit
+    led = []
+
+    async def call() -> str:
+        led.append(True)
+        client = _get_async_client()
+        timings: Dict[str, Dict[str, float]] = {}
+
+        async def send(model: str, on_send):
+            req = _request(system_prompt, user_prompt, json_mode, temperature, model)
+            return await acall_with_retries(
+                lambda timeout: client.chat.completions.with_raw_response.create(**req, timeout=timeout),
+                estimate_tokens(system_prompt, user_prompt), deadline, timing=timings.setdefault(model, {}),
+                on_send=on_send,
+            )
+
+        try:
+            model, resp = await get_router().acall(send, feature)
+        except Exception:
+            _record(feature, started, "error", _slowest(timings))
+            raise
+        _record(feature, started, "ok", timings.get(model), resp.usage, model)
+        out = resp.choices[0].message.content
+        _store(key, out, cache)
+        return out
+
+    out = await _inflight.ado(key, call)
+    if not led:
+        _record(feature, started, "coalesced")
+    return out
+
+async def achat_many(requests: Sequence[ChatRequest], concurrency: int=GROQ_CONCURRENCY) -> List[Union[str, Exception]]:
+    """
+    Run every request through achat() with at most 'concurrency' in flight.
+    Results come back in request order; a failed item holds its exception
+    instead of failing the whole batch.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(req: ChatRequest) -> str:
+        async with sem:
+            if isinstance(req, dict):
+                return await achat(**req)
+            return await achat(*req)
+
+    return await asyncio.gather(*(one(r) for r in requests), return_exceptions=True)
+
+def chat_many(requests: Sequence[ChatRequest], concurrency: int=GROQ_CONCURRENCY) -> List[Union[str, Exception]]:
+    """
+    Blocking wrapper over achat_many() for Streamlit pages and other sync code.
+    e.g. chat_many([(system, chunk) for chunk in chunks]) -> [answer or exception, ...]
+    Batches run on a shared background event loop, so keep-alive connections
+    carry over from one call to the next.
+    """
+    return asyncio.run_coroutine_threadsafe(achat_many(requests, concurrency), _background_loop()).result()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="groq-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def stream_json_items(system_prompt: str, user_prompt: str, key: str, temperature: float=0.2,
+                      deadline: float=GROQ_DEADLINE_SEC, feature: str="other") -> Iterator[Any]:
+    """
+    Elements of the top-level array 'key' of a JSON answer (e.g. "questions"),
+    each yielded as soon as it is complete in the stream.
+    Groq's JSON mode does not stream, so the request streams as plain text
+    (the prompts already ask for JSON only). An answer cached by
+    chat(..., json_mode=True) for the same prompts is served instead, and a
+    streamed answer is cached under that key once its array has closed with
+    at least one element, so prewarmed, streamed and blocking requests share
+    one entry and a truncated stream is never stored.
+    """
+    started = time.monotonic()
+    json_key, hit = _lookup(system_prompt, user_prompt, True, temperature, True)
+    parser = JsonItemStream(key)
+    if hit is not None:
+        _record(feature, started, "cached")
+        yield from parser.feed(hit)
+        return
+    found = 0
+    for piece in chat_stream(system_prompt, user_prompt, temperature=temperature, cache=False, deadline=deadline,
+                             feature=feature):
+        for item in parser.feed(piece):
+            found += 1
+            yield item
+    if found and parser.done:
+        _store(json_key, parser.text, True)
+
+# --------------------- Quiz generation ---------------------
+
+QUIZ_SYSTEM = "You are a strict quiz generator. Always return valid JSON exactly matching the schema."
+
+# one per shard, so parallel shards cover different ground instead of repeating each other
+QUIZ_FOCUS_HINTS = [
+    "core definitions and key facts",
+    "applying the concepts to short scenarios or worked examples",
+    "common mistakes and misconceptions",
+    "comparisons, trade-offs and when to use what",
+    "edge cases and deeper details",
+    "connections to related topics",
+]
+
+def _quiz_prompt(topic: str, n_questions: int, difficulty: str, focus: str="") -> str:
+    focus_line = f"\nFocus these questions on: {focus}." if focus else ""
+    return f"""
+Create a multiple-choice quiz on "{topic}" with {n_questions} questions (difficulty: {difficulty}).{focus_line}
 Schema:
 {{
   "topic": "string",
@@ -47,5 +349,284 @@ Rules:
 - Explanations must be short and factual
 Return only JSON.
 """
-    out = chat(system, user, json_mode=True)
+
+def valid_questions(raw: Any) -> List[Dict[str, Any]]:
+    """The questions in a quiz completion (JSON text or dict) that match the schema; [] if unparseable."""
+    obj = raw
+    if isinstance(raw, str):
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            m = re.search(r"\{.*\}", raw, flags=re.S)
+            try:
+                obj = json.loads(m.group(0)) if m else None
+            except ValueError:
+                obj = None
+    if not isinstance(obj, dict) or not isinstance(obj.get("questions"), list):
+        return []
+    out = []
+    for q in obj["questions"]:
+        if not isinstance(q, dict):
+            continue
+        choices, idx = q.get("choices"), q.get("answer_index")
+        if (isinstance(q.get("q"), str) and q["q"].strip()
+                and isinstance(choices, list) and len(choices) == 4
+                and all(isinstance(c, str) and c.strip() for c in choices)
+                and len({c.strip().lower() for c in choices}) == 4
+                and isinstance(idx, int) and not isinstance(idx, bool) and 0 <= idx <= 3):
+            out.append({"q": q["q"].strip(), "choices": [c.strip() for c in choices], "answer_index": idx,
+                        "explanation": str(q.get("explanation") or "").strip()})
     return out
+
+def _sharded(n_questions: int, shard_size: int) -> bool:
+    return shard_size > 0 and n_questions > shard_size
+
+def _focus(i: int) -> str:
+    """Focus hint number i; past the end of the list they repeat as a new 'set', so each prompt stays distinct."""
+    hint = QUIZ_FOCUS_HINTS[i % len(QUIZ_FOCUS_HINTS)]
+    return hint if i < len(QUIZ_FOCUS_HINTS) else f"{hint} (question set {i // len(QUIZ_FOCUS_HINTS) + 1})"
+
+def _bank_count(topic: str, difficulty: str) -> int:
+    if not QUIZ_BANK:
+        return 0
+    try:
+        return get_bank().count(topic, difficulty)
+    except sqlite3.Error as e:
+        log.warning("question bank read failed: %s", e)
+        return 0
+
+def _bank_draw(topic: str, difficulty: str, n: int, exclude: Sequence[str]=()) -> List[Dict[str, Any]]:
+    if not QUIZ_BANK:
+        return []
+    try:
+        return get_bank().draw(topic, difficulty, n, exclude)
+    except sqlite3.Error as e:
+        log.warning("question bank read failed: %s", e)
+        return []
+
+def _bank_add(topic: str, difficulty: str, questions: List[Dict[str, Any]], served: int=1) -> int:
+    if QUIZ_BANK and questions:
+        try:
+            return get_bank().add(topic, difficulty, questions, served)
+        except sqlite3.Error as e:
+            log.warning("question bank write failed: %s", e)
+    return 0
+
+def _new_questions(topic: str, n_questions: int, difficulty: str, shard_size: int,
+                   variant: int=0) -> List[Dict[str, Any]]:
+    """
+    Freshly generated, schema-valid questions: one completion, or parallel
+    shards for large counts. 'variant' (the topic's bank size) shifts the focus
+    hints, so a topic being restocked gets new prompts rather than cached answers.
+    """
+    if _sharded(n_questions, shard_size):
+        return _sharded_quiz(topic, n_questions, difficulty, shard_size, variant).get("questions", [])
+    prompt = _quiz_prompt(topic, n_questions, difficulty, _focus(variant - 1) if variant else "")
+    qs = valid_questions(chat(QUIZ_SYSTEM, prompt, json_mode=True, feature="quiz"))
+    if not qs:
+        forget(QUIZ_SYSTEM, prompt, json_mode=True)  # don't serve an unusable answer again
+    return qs
+
+def stock_questions(topic: str, n_questions: int=5, difficulty: str="easy", shard_size: int=QUIZ_SHARD_SIZE,
+                    stock: int=QUIZ_BANK_STOCK) -> int:
+    """
+    Generate (unserved) questions into the bank until it holds 'stock' quizzes
+    of 'n_questions' for this topic/difficulty; returns the number added. Used
+    by prewarm and the background top-up.
+    """
+    added = 0
+    while QUIZ_BANK:
+        have = _bank_count(topic, difficulty)
+        if have >= stock * n_questions:
+            break
+        new = _bank_add(topic, difficulty, _new_questions(topic, n_questions, difficulty, shard_size, have), served=0)
+        if not new:
+            break  # nothing new came back: try again on the next top-up
+        added += new
+    return added
+
+_topping_up: set = set()
+_topping_up_lock = threading.Lock()
+
+_PRESET_TOPICS = {normalize(t) for t in QUIZ_PRESETS}
+
+def _top_up(topic: str, n_questions: int, difficulty: str, shard_size: int, unseen: int):
+    """
+    Count this quiz request and restock in a background thread when fewer
+    than QUIZ_BANK_STOCK quizzes' worth are left unseen. Restocking spends the
+    same rate limit interactive requests wait on, so it is only done for
+    preset topics and topics requested at least QUIZ_BANK_RESTOCK_AFTER times,
+    and never while the limiter is in deficit.
+    """
+    if not QUIZ_BANK:
+        return
+    key = (normalize(topic), normalize(difficulty))
+    try:
+        requests = get_bank().request(topic, difficulty)
+    except sqlite3.Error as e:
+        log.warning("question bank write failed: %s", e)
+        return
+    if unseen >= QUIZ_BANK_STOCK * n_questions:
+        return
+    if key[0] not in _PRESET_TOPICS and requests < QUIZ_BANK_RESTOCK_AFTER:
+        return  # a one-off free-text topic: generate on demand only
+    if get_limiter().delay() > 0:
+        return  # students are already queueing; try again on the next request
+    with _topping_up_lock:
+        if key in _topping_up:
+            return
+        _topping_up.add(key)
+
+    def run():
+        try:
+            # 'unseen' is what this student has left; fill that shortfall on top of the current stock
+            have = _bank_count(topic, difficulty)
+            stock_questions(topic, n_questions, difficulty, shard_size,
+                            stock=-(-(have + QUIZ_BANK_STOCK * n_questions - unseen) // n_questions))
+        except Exception as e:
+            log.warning("question bank top-up for %r failed: %s", topic, e)
+        finally:
+            with _topping_up_lock:
+                _topping_up.discard(key)
+
+    threading.Thread(target=run, name="quiz-top-up", daemon=True).start()
+
+def generate_quiz(topic: str, n_questions: int=5, difficulty: str="easy", shard_size: int=QUIZ_SHARD_SIZE,
+                  exclude: Sequence[str]=()) -> str:
+    """
+    Quiz JSON text ({"topic", "questions": [...]}) for the page to parse; "{}" if nothing usable.
+    Questions come from the question bank (core/qbank.py) first, skipping the
+    fingerprints in 'exclude' (what this student has already seen), and only
+    the shortfall is generated: up to 'shard_size' per completion, larger
+    counts as parallel shards (see _sharded_quiz). New questions are banked
+    as served, and a preset or popular topic running low is restocked in
+    the background (see _top_up).
+    """
+    have = _bank_count(topic, difficulty)
+    questions = _bank_draw(topic, difficulty, n_questions, exclude)
+    if len(questions) < n_questions:
+        seen = set(exclude) | {fingerprint(q) for q in questions}
+        try:
+            fresh = _new_questions(topic, n_questions - len(questions), difficulty, shard_size, have)
+        except Exception as e:
+            if not questions:
+                raise
+            log.warning("quiz generation failed, serving %d banked questions: %s", len(questions), e)
+            fresh = []
+        new = []
+        for q in fresh:
+            fp = fingerprint(q)
+            if fp not in seen:
+                seen.add(fp)
+                new.append(q)
+        _bank_add(topic, difficulty, new)
+        questions += new
+    _top_up(topic, n_questions, difficulty, shard_size, have - len(set(exclude)) - n_questions)
+    if not questions:
+        return "{}"
+    return json.dumps({"topic": topic, "questions": questions[:n_questions]}, ensure_ascii=False)
+
+def stream_quiz(topic: str, n_questions: int=5, difficulty: str="easy",
+                shard_size: int=QUIZ_SHARD_SIZE, exclude: Sequence[str]=()) -> Iterator[Dict[str, Any]]:
+    """
+    The questions generate_quiz() would return, yielded one by one: banked
+    ones at once, then (for a single completion) each new one as soon as it
+    has streamed in, schema-checked and deduplicated; sharded shortfalls
+    arrive once merged. New questions are banked when the stream ends.
+    """
+    have = _bank_count(topic, difficulty)
+    banked = _bank_draw(topic, difficulty, n_questions, exclude)
+    seen = set(exclude) | {fingerprint(q) for q in banked}
+    yield from banked
+    need = n_questions - len(banked)
+    if need <= 0:
+        _top_up(topic, n_questions, difficulty, shard_size, have - len(set(exclude)) - n_questions)
+        return
+    fresh: List[Dict[str, Any]] = []
+    try:
+        if _sharded(need, shard_size):
+            items = _new_questions(topic, need, difficulty, shard_size, have)
+        else:
+            prompt = _quiz_prompt(topic, need, difficulty, _focus(have - 1) if have else "")
+            items = (q for item in stream_json_items(QUIZ_SYSTEM, prompt, "questions", feature="quiz")
+                     for q in valid_questions({"questions": [item]}))
+        for q in items:
+            fp = fingerprint(q)
+            if fp not in seen and len(fresh) < need:
+                seen.add(fp)
+                fresh.append(q)
+                yield q
+        if not fresh and not _sharded(need, shard_size):
+            forget(QUIZ_SYSTEM, prompt, json_mode=True)  # nothing usable or new: don't serve it again
+    except Exception as e:
+        if not banked:
+            raise
+        log.warning("quiz generation failed, serving %d banked questions: %s", len(banked), e)
+    finally:
+        _bank_add(topic, difficulty, fresh)
+        _top_up(topic, n_questions, difficulty, shard_size, have - len(set(exclude)) - n_questions)
+
+def _sharded_quiz(topic: str, n_questions: int, difficulty: str, shard_size: int,
+                  variant: int=0) -> Dict[str, Any]:
+    """
+    Split the quiz into near-equal shards, each with its own focus hint, and
+    request them through chat_many(). A shard whose answer does not validate
+    (bad JSON, too few schema-valid questions, or an error) is retried on its
+    own, with its cached answer dropped, for up to QUIZ_SHARD_RETRIES more
+    rounds. Valid questions are merged in shard order and deduplicated by
+    normalized question text; one extra shard fills any gap that leaves, and
+    the result is trimmed to 'n_questions'. 'variant' offsets the focus hints.
+    """
+    count = -(-n_questions // shard_size)
+    sizes = [n_questions // count + (1 if i < n_questions % count else 0) for i in range(count)]
+    prompts = [_quiz_prompt(topic, size, difficulty, _focus(variant + i))
+               for i, size in enumerate(sizes)]
+    best: List[List[Dict[str, Any]]] = [[] for _ in sizes]
+    errors: List[Optional[Exception]] = [None] * count
+    pending = list(range(count))
+    for attempt in range(QUIZ_SHARD_RETRIES + 1):
+        if attempt:
+            for i in pending:
+                forget(QUIZ_SYSTEM, prompts[i], json_mode=True)
+        results = chat_many([dict(system_prompt=QUIZ_SYSTEM, user_prompt=prompts[i], json_mode=True, feature="quiz")
+                             for i in pending])
+        failed = []
+        for i, out in zip(pending, results):
+            if isinstance(out, Exception):
+                errors[i] = out
+                failed.append(i)
+                continue
+            qs = valid_questions(out)
+            if len(qs) > len(best[i]):
+                best[i] = qs
+            if len(qs) < sizes[i]:
+                failed.append(i)
+        pending = failed
+        if not pending:
+            break
+
+    merged, seen = [], set()
+
+    def add(qs: List[Dict[str, Any]]):
+        for q in qs:
+            fp = fingerprint(q)
+            if fp not in seen:
+                seen.add(fp)
+                merged.append(q)
+
+    for qs in best:
+        add(qs)
+    missing = n_questions - len(merged)
+    if merged and missing > 0:
+        # duplicates (or short shards) left gaps: one top-up shard on a fresh focus
+        focus = _focus(variant + count)
+        try:
+            add(valid_questions(chat(QUIZ_SYSTEM, _quiz_prompt(topic, missing + 1, difficulty, focus), json_mode=True,
+                                     feature="quiz")))
+        except Exception as e:
+            log.warning("quiz top-up shard failed: %s", e)
+    if not merged:
+        if all(errors):
+            raise errors[0]
+        return {}  # nothing usable: the page reports a failed generation
+    return {"topic": topic, "questions": merged[:n_questions]}
@@ -0,0 +1,109 @@
+# core/presets.py
+#
+# One-click preset prompts shown on the pages. They live here, not inside
+# the page scripts, so core/prewarm.py can run the very same requests ahead
+# of time and fill the response cache.
+
+# Academic Q&A: domain -> preset questions (academic_qa(question, domain))
+QNA_PRESETS = {
+    "general": [
+        "Summarize the key differences between correlation and causation with examples.",
+        "How do I structure a strong literature review chapter?",
+        "Explain Bloom’s taxonomy and how to apply it while studying."
+    ],
+    "math": [
+        "Explain backpropagation in simple terms with a tiny numeric example.",
+        "What’s the difference between eigenvalues and singular values?",
+        "How does gradient descent differ from Newton’s method?"
+    ],
+    "cs": [
+        "Explain time complexity vs space complexity with examples.",
+        "What is normalization in databases? Show a quick example.",
+        "How do hash tables handle collisions? Compare methods."
+    ],
+    "biology": [
+        "Explain CRISPR-Cas9 editing in simple steps.",
+        "Innate vs adaptive immunity—compare with examples.",
+        "How do vaccines generate immunological memory?"
+    ],
+    "economics": [
+        "Explain price elasticity of demand with a quick example.",
+        "Key differences between monetary and fiscal policy?",
+        "What is comparative advantage? Give a simple scenario."
+    ],
+    "history": [
+        "What were the core causes of World War I in brief?",
+        "Compare Enlightenment thinkers: Locke vs Rousseau.",
+        "How did the Industrial Revolution change labor?"
+    ],
+}
+
+# Personalized Learning: study_plan() arguments
+PLAN_PRESETS = [
+    {
+        "name": "Student",
+        "course": "Calculus I",
+        "grade": "Beginner",
+        "goals": "Master limits, derivatives, and basic integrals; build problem-solving speed; aim for an A.",
+        "hours": 6
+    },
+    {
+        "name": "Student",
+        "course": "Data Structures",
+        "grade": "Intermediate",
+        "goals": "Solidify arrays, stacks, queues, linked lists, trees; practice complexity analysis and coding patterns.",
+        "hours": 8
+    },
+    {
+        "name": "Student",
+        "course": "Machine Learning Basics",
+        "grade": "Beginner",
+        "goals": "Understand train/test splits, linear/logistic regression, overfitting/regularization; implement in scikit-learn.",
+        "hours": 7
+    },
+]
+
+# Quiz: one-click topics, generated with the page's default slider/difficulty
+QUIZ_PRESETS = [
+    "Data Structures (Arrays/Stacks/Queues)",
+    "Time Complexity & Big-O",
+    "SQL Basics & Joins",
+    "OOP Principles",
+    "Networking: OSI vs TCP/IP",
+    "Linear Algebra (Vectors/Matrices)",
+]
+QUIZ_DEFAULT_N = 5
+QUIZ_DEFAULT_DIFFICULTY = "medium"
+
+# Coding Mentor
+CODING_LANGS = ["python","javascript","java","c++","c","go","rust"]
+
+# (button title, reviewer focus); these need the user's code, so they are not prewarmed
+REVIEW_PRESETS = [
+    ("Clean code & readability", "Focus on clarity, naming, comments, and structure."),
+    ("Performance & complexity", "Identify hotspots and reduce time/space complexity."),
+    ("Security & edge cases", "Spot injection risks, unsafe eval, and missing checks."),
+    ("Refactor with functions/classes", "Propose modularization with functions/classes."),
+    ("Docstrings & type hints", "Add concise docstrings and Python type hints."),
+]
+
+# (button label, error text sent to debug_help)
+DEBUG_PRESETS = [
+    ("NoneType is not subscriptable (Python)", "TypeError: 'NoneType' object is not subscriptable"),
+    ("List index out of range (Python)", "IndexError: list index out of range"),
+    ("CORS error (Web/JS)", "Access to fetch at '…' from origin '…' has been blocked by CORS policy"),
+    ("Module not found (Node/Python)", "ModuleNotFoundError / Cannot find module 'x'"),
+    ("NullPointerException (Java)", "java.lang.NullPointerException"),
+]
+
+CONCEPT_PRESETS = [
+    "Big-O notation with simple examples",
+    "Async vs threading (Python/JS)",
+    "REST vs GraphQL: when to choose which?",
+    "SQL joins (inner/left/right/full) with small tables",
+    "OOP: encapsulation, inheritance, polymorphism",
+    "Dependency injection: what and why?",
+]
+
+def concept_preset_prompt(label: str) -> str:
+    return f"{label} — provide a brief explanation with a tiny example."
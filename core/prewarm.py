@@ -0,0 +1,96 @@
+# core/prewarm.py
+#
+# Background job that runs every preset prompt (core/presets.py) through the
+# same module functions the pages call, so the response cache already holds
+# the answer when a student clicks a preset. Quiz presets instead stock the
+# question bank (core/qbank.py) with QUIZ_BANK_STOCK quizzes' worth each.
+#
+# Env (set via .env or Streamlit Secrets):
+#   PREWARM=1                  # 0 disables the job
+#   PREWARM_CONCURRENCY=2      # presets requested at once
+#   PREWARM_EVERY_SEC=43200    # re-run this often to refill expired entries; 0 = startup only
+#
+# start_prewarm() is called from render_sidebar() (every page) and starts the
+# job once per server process; presets already cached cost no Groq call.
+
+import logging, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import GROQ_API_KEY, PREWARM, PREWARM_CONCURRENCY, PREWARM_EVERY_SEC, RESPONSE_CACHE
+from .presets import (
+    CODING_LANGS, CONCEPT_PRESETS, DEBUG_PRESETS, PLAN_PRESETS, QNA_PRESETS, QUIZ_DEFAULT_DIFFICULTY,
+    QUIZ_DEFAULT_N, QUIZ_PRESETS, concept_preset_prompt,
+)
+
+log = logging.getLogger(__name__)
+
+def preset_jobs() -> List[Tuple[str, Callable[[], object]]]:
+    """(label, call) for every preset whose request is fully known before a click."""
+    # imported here: modules import core, not the other way round
+    from modules.coding import concept_explain, debug_help
+    from modules.personalization import study_plan
+    from modules.qa import academic_qa
+    from .models_groq import stock_questions
+
+    lang = CODING_LANGS[0]
+    jobs: List[Tuple[str, Callable[[], object]]] = []
+    for domain, questions in QNA_PRESETS.items():
+        for q in questions:
+            jobs.append((f"qna:{domain}:{q[:40]}", lambda q=q, d=domain: academic_qa(q.strip(), d)))
+    for p in PLAN_PRESETS:
+        jobs.append((f"plan:{p['course']}",
+                     lambda p=p: study_plan(p["name"], p["course"], p["grade"], p["goals"], p["hours"])))
+    for topic in QUIZ_PRESETS:
+        jobs.append((f"quiz:{topic}", lambda t=topic: stock_questions(t.strip(), QUIZ_DEFAULT_N, QUIZ_DEFAULT_DIFFICULTY)))
+    # as clicked with an empty error box and snippet, in the default language
+    for label, err in DEBUG_PRESETS:
+        jobs.append((f"debug:{label}", lambda e=err: debug_help(e, "", lang)))
+    for label in CONCEPT_PRESETS:
+        jobs.append((f"concept:{label}", lambda l=label: concept_explain(concept_preset_prompt(l), lang)))
+    return jobs
+
+def prewarm(concurrency: int = PREWARM_CONCURRENCY) -> Dict[str, int]:
+    """Run every preset job with at most 'concurrency' in flight; returns {'ok': n, 'failed': n}."""
+    def run(job: Tuple[str, Callable[[], object]]) -> bool:
+        label, call = job
+        try:
+            call()
+            return True
+        except Exception as e:
+            log.warning("prewarm %s failed: %s", label, e)
+            return False
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="prewarm") as pool:
+        done = list(pool.map(run, preset_jobs()))
+    stats = {"ok": sum(done), "failed": len(done) - sum(done)}
+    log.info("prewarmed %d presets (%d failed) in %.1fs", stats["ok"], stats["failed"], time.monotonic() - started)
+    return stats
+
+# --------------------- Background job ---------------------
+
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+
+def _loop():
+    while True:
+        try:
+            prewarm()
+        except Exception:
+            log.exception("prewarm run failed")
+        if PREWARM_EVERY_SEC <= 0:
+            return
+        time.sleep(PREWARM_EVERY_SEC)
+
+def start_prewarm() -> bool:
+    """Start the prewarm thread once per process; False when disabled or nothing to fill."""
+    global _thread
+    if not (PREWARM and RESPONSE_CACHE and GROQ_API_KEY):
+        return False
+    if _thread is None:
+        with _thread_lock:
+            if _thread is None:
+                _thread = threading.Thread(target=_loop, name="prewarm", daemon=True)
+                _thread.start()
+    return True
@@ -0,0 +1,149 @@
+# core/qbank.py
+#
+# Local question bank for quizzes. Every schema-valid question that
+# core.models_groq generates is kept in DATA_DIR/question_bank.db, indexed by
+# normalized topic and difficulty and deduplicated by a fingerprint of its
+# text. Quiz requests draw from the bank first and only the shortfall goes to
+# Groq, so popular topics stop costing live calls once they are stocked.
+#
+# Env (set via .env or Streamlit Secrets):
+#   QUIZ_BANK=1         # 0: always generate quizzes from scratch (nothing stored)
+#   QUIZ_BANK_STOCK=3   # top a topic up in the background below this many quizzes' worth of questions
+#   QUIZ_BANK_RESTOCK_AFTER=3  # ...but a free-text (non-preset) topic only once it has had this many requests
+#
+# draw() prefers the questions served least often (random among ties), so
+# repeated quizzes on a topic rotate through everything the bank holds;
+# callers pass the fingerprints a student has already seen as 'exclude'.
+
+import json, re, sqlite3, threading, time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .config import DATA_DIR
+
+def normalize(text: str) -> str:
+    """Lowercase words and digits only: 'Big-O  Notation!' -> 'big o notation'."""
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", (text or "").lower()).split())
+
+def fingerprint(question: Dict[str, Any]) -> str:
+    """Identity of a question for deduplication: its normalized text."""
+    return normalize(question["q"])
+
+class QuestionBank:
+    """SQLite-backed (WAL, one connection per thread), shared by every process on the host."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        con = self._conn()
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id          INTEGER PRIMARY KEY,
+                topic_key   TEXT NOT NULL,
+                difficulty  TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                question    TEXT NOT NULL,
+                created     REAL NOT NULL,
+                served      INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (topic_key, difficulty, fingerprint)
+            )""")
+        con.execute("CREATE INDEX IF NOT EXISTS questions_pick ON questions (topic_key, difficulty, served)")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                topic_key   TEXT NOT NULL,
+                difficulty  TEXT NOT NULL,
+                n           INTEGER NOT NULL,
+                PRIMARY KEY (topic_key, difficulty)
+            )""")
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def add(self, topic: str, difficulty: str, questions: Iterable[Dict[str, Any]], served: int = 0) -> int:
+        """
+        Store validated questions; ones already banked for this topic/difficulty are skipped.
+        'served' starts their serve count (1 for questions just handed to a student). Returns the number added.
+        """
+        now = time.time()
+        rows = [(normalize(topic), normalize(difficulty), fingerprint(q), json.dumps(q, ensure_ascii=False), now, served)
+                for q in questions]
+        con = self._conn()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            before = con.total_changes
+            con.executemany("INSERT OR IGNORE INTO questions (topic_key, difficulty, fingerprint, question, created, served) "
+                            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added = con.total_changes - before
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        return added
+
+    def draw(self, topic: str, difficulty: str, n: int, exclude: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """Up to n banked questions, least served first; 'exclude' holds fingerprints to skip."""
+        if n <= 0:
+            return []
+        skip = set(exclude)
+        con = self._conn()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            picked = []
+            for qid, fp, question in con.execute(
+                    "SELECT id, fingerprint, question FROM questions WHERE topic_key = ? AND difficulty = ? "
+                    "ORDER BY served, RANDOM()", (normalize(topic), normalize(difficulty))):
+                if fp not in skip:
+                    picked.append((qid, json.loads(question)))
+                    if len(picked) >= n:
+                        break
+            con.executemany("UPDATE questions SET served = served + 1 WHERE id = ?", [(qid,) for qid, _ in picked])
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        return [q for _, q in picked]
+
+    def request(self, topic: str, difficulty: str) -> int:
+        """Count one quiz request for this topic/difficulty; returns the total so far."""
+        key = (normalize(topic), normalize(difficulty))
+        con = self._conn()
+        con.execute("INSERT INTO requests (topic_key, difficulty, n) VALUES (?, ?, 1) "
+                    "ON CONFLICT (topic_key, difficulty) DO UPDATE SET n = n + 1", key)
+        return con.execute("SELECT n FROM requests WHERE topic_key = ? AND difficulty = ?", key).fetchone()[0]
+
+    def count(self, topic: Optional[str] = None, difficulty: Optional[str] = None) -> int:
+        sql, args = "SELECT COUNT(*) FROM questions WHERE 1=1", []
+        if topic is not None:
+            sql += " AND topic_key = ?"
+            args.append(normalize(topic))
+        if difficulty is not None:
+            sql += " AND difficulty = ?"
+            args.append(normalize(difficulty))
+        return self._conn().execute(sql, args).fetchone()[0]
+
+    def topics(self) -> List[Dict[str, Any]]:
+        """[{'topic', 'difficulty', 'questions', 'served'}], largest first."""
+        rows = self._conn().execute(
+            "SELECT topic_key, difficulty, COUNT(*), SUM(served) FROM questions "
+            "GROUP BY topic_key, difficulty ORDER BY COUNT(*) DESC").fetchall()
+        return [{"topic": t, "difficulty": d, "questions": n, "served": s} for t, d, n, s in rows]
+
+# --------------------- Process-wide bank ---------------------
+
+_bank: Optional[QuestionBank] = None
+_bank_lock = threading.Lock()
+
+def get_bank() -> QuestionBank:
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = QuestionBank(Path(DATA_DIR) / "question_bank.db")
+    return _bank
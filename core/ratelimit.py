@@ -0,0 +1,292 @@
+# core/ratelimit.py
+#
+# Client-side pacing and retries for Groq calls (used by core/models_groq.py).
+#
+# Env (set via .env or Streamlit Secrets):
+#   GROQ_RPM=30                # requests/minute until Groq's headers say otherwise
+#   GROQ_TPM=6000              # tokens/minute, likewise
+#   GROQ_MAX_RETRIES=5         # retries on 429 / 5xx / connection errors
+#   GROQ_BACKOFF_BASE_SEC=0.5  # backoff before retry n is uniform in [0, base * 2**n]...
+#   GROQ_BACKOFF_MAX_SEC=20    # ...capped here (and never shorter than Retry-After)
+#   GROQ_DEADLINE_SEC=60       # per-call budget across waits, attempts and backoff
+#
+# One process-wide limiter holds token buckets for requests/minute,
+# tokens/minute and (once Groq reports it) requests/day. Every call reserves
+# from all of them before it is sent, waiting while any is in deficit, and
+# every response re-syncs the buckets from Groq's x-ratelimit-* headers
+# (-requests is the daily limit, -tokens the per-minute one), so the app runs
+# close to the provider's real limit instead of discovering it via 429s.
+# A call whose wait would overrun its deadline is rejected before it reserves
+# anything, and a reservation abandoned before sending is given back, so only
+# requests that actually go out count against the buckets.
+
+import asyncio, random, re, threading, time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+import groq
+
+from .config import (
+    GROQ_RPM, GROQ_TPM, GROQ_MAX_RETRIES, GROQ_BACKOFF_BASE_SEC, GROQ_BACKOFF_MAX_SEC, GROQ_DEADLINE_SEC,
+)
+
+class DeadlineExceeded(TimeoutError):
+    """The call could not finish (or even be sent) within its deadline."""
+
+_DURATION_RE = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Groq reset headers look like '2m59.56s', '7.66s' or '120ms'; plain numbers are seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    m = _DURATION_RE.match(value)
+    if not m or not any(m.groups()):
+        return None
+    h, mins, s, ms = (float(g) if g else 0.0 for g in m.groups())
+    return h * 3600 + mins * 60 + s + ms / 1000
+
+class TokenBucket:
+    """
+    'capacity' units refilled evenly over 'period' seconds. reserve() always
+    succeeds but may leave the bucket in deficit; the returned delay is how
+    long the caller must wait before using what it reserved.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.period = period
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """What reserve(amount) would return, without reserving."""
+        self._refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def reserve(self, amount: float, now: float) -> float:
+        wait = self.delay(amount, now)
+        # never more than one full window in debt
+        self.level = max(-self.capacity, self.level - min(amount, self.capacity))
+        return wait
+
+    def refund(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + min(amount, self.capacity))
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float], now: float):
+        """Adopt the server's view: its limit, and what is left until it resets."""
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.capacity, float(remaining))
+            if remaining <= 0 and reset:
+                # exhausted: nothing more until the window resets
+                self.level = -reset * self.rate
+
+class RateLimiter:
+    """Request and token buckets for one provider, shared by every thread (and loop) in the process."""
+
+    def __init__(self, rpm: float = GROQ_RPM, tpm: float = GROQ_TPM):
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.rpd: Optional[TokenBucket] = None  # created from the first response's headers
+        self.waiting = 0  # reservations not yet sent
+        self._lock = threading.Lock()
+
+    def _buckets(self, tokens: int):
+        yield self.rpm, 1
+        yield self.tpm, tokens
+        if self.rpd is not None:
+            yield self.rpd, 1
+
+    def reserve(self, tokens: int, deadline: Optional[float] = None) -> float:
+        """
+        Reserve one request and 'tokens' tokens; returns the seconds to wait
+        before sending. Raises DeadlineExceeded, reserving nothing, if that wait
+        would end past 'deadline' (a time.monotonic() value). Follow with
+        sent() once the request goes out, or refund() if it never will.
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = max(bucket.delay(n, now) for bucket, n in self._buckets(tokens))
+            if deadline is not None and now + wait >= deadline:
+                raise DeadlineExceeded("Groq rate limit would delay this call past its deadline")
+            for bucket, n in self._buckets(tokens):
+                bucket.reserve(n, now)
+            self.waiting += 1
+            return wait
+
+    def delay(self, tokens: int = 0) -> float:
+        """Seconds a request reserved now would wait (0 when the limiter is not in deficit); reserves nothing."""
+        now = time.monotonic()
+        with self._lock:
+            return max(bucket.delay(n, now) for bucket, n in self._buckets(tokens))
+
+    def sent(self):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+
+    def refund(self, tokens: int):
+        """Give back a reservation whose request was never sent (e.g. the caller was cancelled while waiting)."""
+        now = time.monotonic()
+        with self._lock:
+            for bucket, n in self._buckets(tokens):
+                bucket.refund(n, now)
+            self.waiting = max(0, self.waiting - 1)
+
+    def observe(self, headers: Optional[Mapping[str, str]]):
+        """Re-sync the buckets from x-ratelimit-* response headers (missing ones are ignored)."""
+        if not headers:
+            return
+        now = time.monotonic()
+        with self._lock:
+            rpd_limit = _number(headers.get("x-ratelimit-limit-requests"))
+            if rpd_limit and self.rpd is None:
+                self.rpd = TokenBucket(rpd_limit, period=86400.0)
+            for kind, bucket in (("requests", self.rpd), ("tokens", self.tpm)):
+                if bucket is not None:
+                    bucket.sync(_number(headers.get(f"x-ratelimit-limit-{kind}")),
+                                _number(headers.get(f"x-ratelimit-remaining-{kind}")),
+                                parse_duration(headers.get(f"x-ratelimit-reset-{kind}")), now)
+            # Groq reports no per-minute request headers; a request it just accepted means any
+            # request debt beyond the callers still queued behind us is stale
+            self.rpm._refill(now)
+            self.rpm.level = max(self.rpm.level, -float(self.waiting))
+
+    def pause(self, seconds: float):
+        """After a 429: hold every caller back for 'seconds'."""
+        now = time.monotonic()
+        with self._lock:
+            self.rpm._refill(now)
+            # the next reserve() then waits exactly 'seconds'
+            self.rpm.level = min(self.rpm.level, 1 - seconds * self.rpm.rate)
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def estimate_tokens(*texts: str, completion: int = 512) -> int:
+    """Rough prompt size (~4 chars/token) plus an allowance for the answer."""
+    return sum(len(t or "") for t in texts) // 4 + completion
+
+# --------------------- Retries ---------------------
+
+def _retry_delay(err: Exception, attempt: int, deadline: float, limiter: RateLimiter) -> float:
+    """
+    Backoff before retrying after 'err', or re-raise when it is not worth
+    retrying: not a 429/5xx/connection error, out of retries, or past the deadline.
+    """
+    headers = None
+    if isinstance(err, groq.APIStatusError):
+        if err.status_code != 429 and err.status_code < 500:
+            raise err
+        headers = err.response.headers
+    elif not isinstance(err, groq.APIConnectionError):
+        raise err
+    if attempt >= GROQ_MAX_RETRIES:
+        raise err
+    delay = random.uniform(0, min(GROQ_BACKOFF_MAX_SEC, GROQ_BACKOFF_BASE_SEC * 2 ** attempt))
+    if headers is not None:
+        limiter.observe(headers)
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after:
+            delay = max(delay, retry_after)
+    if time.monotonic() + delay >= deadline:
+        raise DeadlineExceeded(f"Groq call gave up after {attempt + 1} attempt(s): {err}") from err
+    if headers is not None and err.status_code == 429:
+        # the whole process backs off; this caller waits in its next reserve()
+        limiter.pause(delay)
+        return 0.0
+    return delay
+
+def _waited(wait: float, timing: Optional[Dict[str, float]]) -> float:
+    if timing is not None:
+        timing["queue"] = timing.get("queue", 0.0) + wait
+    return wait
+
+def call_with_retries(send: Callable[[float], Any], tokens: int, deadline_sec: float = GROQ_DEADLINE_SEC,
+                      limiter: Optional[RateLimiter] = None, timing: Optional[Dict[str, float]] = None,
+                      on_send: Optional[Callable[[], None]] = None) -> Any:
+    """
+    send(timeout) issues one request via the SDK's .with_raw_response and
+    returns the raw response; this paces it through the limiter, retries it,
+    feeds the rate-limit headers back and returns the parsed result.
+    timing["queue"], if given, accumulates the seconds spent waiting (limiter and backoff).
+    on_send(), if given, is called right before each attempt goes out.
+    """
+    limiter = limiter or get_limiter()
+    deadline = time.monotonic() + deadline_sec
+    attempt = 0
+    while True:
+        wait = limiter.reserve(tokens, deadline)
+        try:
+            time.sleep(_waited(wait, timing))
+        except BaseException:
+            limiter.refund(tokens)
+            raise
+        limiter.sent()
+        if on_send is not None:
+            on_send()
+        try:
+            raw = send(deadline - time.monotonic())
+        except Exception as e:
+            time.sleep(_waited(_retry_delay(e, attempt, deadline, limiter), timing))
+            attempt += 1
+            continue
+        limiter.observe(raw.headers)
+        return raw.parse()
+
+async def acall_with_retries(send: Callable[[float], Awaitable[Any]], tokens: int,
+                             deadline_sec: float = GROQ_DEADLINE_SEC, limiter: Optional[RateLimiter] = None,
+                             timing: Optional[Dict[str, float]] = None,
+                             on_send: Optional[Callable[[], None]] = None) -> Any:
+    """asyncio version of call_with_retries(); waits without blocking the loop."""
+    limiter = limiter or get_limiter()
+    deadline = time.monotonic() + deadline_sec
+    attempt = 0
+    while True:
+        wait = limiter.reserve(tokens, deadline)
+        try:
+            await asyncio.sleep(_waited(wait, timing))
+        except BaseException:  # cancelled while queued (e.g. a hedge that lost): nothing was sent
+            limiter.refund(tokens)
+            raise
+        limiter.sent()
+        if on_send is not None:
+            on_send()
+        try:
+            raw = await send(deadline - time.monotonic())
+        except Exception as e:
+            await asyncio.sleep(_waited(_retry_delay(e, attempt, deadline, limiter), timing))
+            attempt += 1
+            continue
+        limiter.observe(raw.headers)
+        return await raw.parse()
+
+# --------------------- Process-wide limiter ---------------------
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
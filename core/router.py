@@ -0,0 +1,360 @@
+# core/router.py
+#
+# Per-feature model routing and hedged requests for Groq chat calls
+# (used by core/models_groq.py).
+#
+# Env (set via .env or Streamlit Secrets):
+#   GROQ_MODELS=llama-3.1-8b-instant,llama-3.3-70b-versatile
+#                               # candidate models, preferred first (default: just GROQ_MODEL, i.e. no routing)
+#   GROQ_LATENCY_BUDGETS=qna=6,quiz=30   # seconds per feature tag, overriding FEATURE_BUDGETS below
+#   GROQ_HEDGE=0                # 1: send a second (hedged) request to another GROQ_MODELS entry when one is slow
+#   GROQ_HEDGE_MIN_SAMPLES=20   # calls per model and feature before its own p95 is trusted
+#
+# Routing: every feature (the telemetry tag: "qna", "quiz", ...) has a
+# latency budget. route() picks the first candidate whose observed p95 for
+# that feature fits the budget; a model with too few samples counts as
+# fitting, so it gets measured. If none fits, the fastest p95 wins.
+# Streams are judged on time to first chunk against a quarter of the budget.
+#
+# Hedging (opt-in): if the chosen model has not answered by its own p95 for
+# the feature (until that is known: by the budget), counted from when the
+# request actually went out rather than from any rate-limiter wait, the same
+# request also goes to the fastest other candidate and whichever answers
+# first is used. No hedge is sent while the rate limiter is in deficit, so
+# hedging never adds load at the limit. The loser is cancelled where
+# possible (async calls, streams) and otherwise ignored. By construction
+# about 5% of calls hedge, which cuts the slow tail.
+
+import asyncio, queue, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from .config import GROQ_CONCURRENCY, GROQ_HEDGE, GROQ_HEDGE_MIN_SAMPLES, GROQ_LATENCY_BUDGETS, GROQ_MODEL, GROQ_MODELS
+from .ratelimit import get_limiter
+from .telemetry import Histogram
+
+T = TypeVar("T")
+
+# seconds from request to complete answer that each feature should stay within
+FEATURE_BUDGETS: Dict[str, float] = {
+    "qna": 8.0,
+    "qna.summary": 10.0,
+    "coding.concept": 8.0,
+    "coding.debug": 10.0,
+    "coding.review": 20.0,
+    "plan": 15.0,
+    "flashcards": 10.0,
+    "quiz": 20.0,
+    "other": 30.0,
+}
+
+HEDGE_MIN_DELAY_SEC = 0.25  # never hedge sooner than this, however fast the p95
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """'qna=6, quiz=30' -> {'qna': 6.0, 'quiz': 30.0}; malformed entries are ignored."""
+    out = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.partition("=")
+        try:
+            out[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return out
+
+class ModelRouter:
+    """Latency histograms per (model, feature) and the routing/hedging built on them. Thread-safe."""
+
+    def __init__(self, models: List[str], budgets: Optional[Dict[str, float]] = None, hedge: bool = True,
+                 min_samples: int = GROQ_HEDGE_MIN_SAMPLES):
+        self.models = list(dict.fromkeys(m for m in models if m)) or [GROQ_MODEL]
+        self.budgets = {**FEATURE_BUDGETS, **(budgets or {})}
+        self.hedge, self.min_samples = hedge, min_samples
+        self._latency: Dict[Tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self.hedges = self.hedge_wins = 0
+
+    def budget(self, feature: str) -> float:
+        return self.budgets.get(feature, self.budgets["other"])
+
+    def observe(self, model: str, feature: str, seconds: float, kind: str = "total"):
+        """kind: 'total' (complete answer) or 'first' (first chunk of a stream)."""
+        with self._lock:
+            hist = self._latency.get((model, feature, kind))
+            if hist is None:
+                hist = self._latency[(model, feature, kind)] = Histogram()
+            hist.add(seconds)
+
+    def p95(self, model: str, feature: str, kind: str = "total") -> Optional[float]:
+        with self._lock:
+            hist = self._latency.get((model, feature, kind))
+            return hist.quantile(0.95) if hist is not None and hist.n >= self.min_samples else None
+
+    def route(self, feature: str, kind: str = "total") -> Tuple[str, Optional[str], Optional[float]]:
+        """
+        (model, fallback model or None, seconds to wait before hedging to it or None).
+        kind='first' routes a stream on time to first chunk, against a quarter of the budget.
+        """
+        budget = self.budget(feature) if kind == "total" else self.budget(feature) / 4
+        p95s = {m: self.p95(m, feature, kind) for m in self.models}
+        fits = [m for m in self.models if p95s[m] is None or p95s[m] <= budget]
+        model = fits[0] if fits else min(self.models, key=lambda m: p95s[m])
+        others = [m for m in self.models if m != model]
+        if not (self.hedge and others):
+            return model, None, None
+        # fastest measured model first, then unmeasured ones in preference order
+        fallback = min(others, key=lambda m: (p95s[m] is None, p95s[m] or 0.0, self.models.index(m)))
+        after = p95s[model] if p95s[model] is not None else budget
+        return model, fallback, max(HEDGE_MIN_DELAY_SEC, after)
+
+    def _timed(self, send: Callable[[str, Callable[[], None]], T], model: str, feature: str) -> T:
+        """send() on the caller's thread; latency counts from the moment the request goes out."""
+        sent: List[float] = []
+        out = send(model, lambda: sent or sent.append(time.monotonic()))
+        self.observe(model, feature, time.monotonic() - (sent[0] if sent else time.monotonic()))
+        return out
+
+    def _can_hedge(self) -> bool:
+        """A hedge is only worth sending if it can go out now: never while our own limiter is in deficit."""
+        return get_limiter().delay() <= 0
+
+    def _race(self, q: "queue.Queue[Tuple[str, str, Any]]", start_fallback: Callable[[], None], model: str,
+              fallback: str, after: float, sent: Dict[str, float]) -> Tuple[str, str, Any]:
+        """
+        Read (model, kind, value) messages until one model delivers: kind 'sent'
+        (the request went out), 'error', or anything else (a result or stream
+        item), which is returned. The fallback is started once the primary has
+        been out for 'after' seconds without delivering. Raises the first error
+        once every started request has failed.
+        """
+        hedge_at: Optional[float] = None
+        running, errors = {model}, []
+        while True:
+            try:
+                msg = q.get(timeout=None if hedge_at is None else max(0.0, hedge_at - time.monotonic()))
+            except queue.Empty:
+                hedge_at = None  # one chance per call
+                if self._can_hedge():
+                    running.add(fallback)
+                    start_fallback()
+                    self._hedged()
+                continue
+            m, kind, value = msg
+            if kind == "sent":
+                if m == model and fallback not in running:
+                    hedge_at = sent[m] + after
+            elif kind == "error":
+                running.discard(m)
+                errors.append(value)
+                if m == model:
+                    hedge_at = None
+                if not running:
+                    raise errors[0]
+            else:
+                return msg
+
+    def _sender(self, q: "queue.Queue[Tuple[str, str, Any]]", m: str, sent: Dict[str, float]) -> Callable[[], None]:
+        def on_send():
+            if m not in sent:
+                sent[m] = time.monotonic()
+                q.put((m, "sent", None))
+        return on_send
+
+    def call(self, send: Callable[[str, Callable[[], None]], T], feature: str) -> Tuple[str, T]:
+        """
+        (model, send(model, on_send)) for the routed model, hedged to the
+        fallback if it is slow. send() must call on_send() right before the
+        request goes out (after any rate-limiter wait): the hedge clock and the
+        latency samples start there. Without a fallback the call runs on the
+        caller's thread; with one, the primary gets its own thread (a blocking
+        request cannot be abandoned from the thread running it) and the hedge
+        runs on a small shared pool.
+        """
+        model, fallback, after = self.route(feature)
+        if fallback is None:
+            return model, self._timed(send, model, feature)
+        q: "queue.Queue[Tuple[str, str, Any]]" = queue.Queue()
+        sent: Dict[str, float] = {}
+
+        def run(m: str):
+            try:
+                q.put((m, "ok", send(m, self._sender(q, m, sent))))
+            except BaseException as e:
+                q.put((m, "error", e))
+
+        threading.Thread(target=run, args=(model,), name="groq-call", daemon=True).start()
+        winner, _, out = self._race(q, lambda: _executor().submit(run, fallback), model, fallback, after, sent)
+        self._settle(winner, [m for m in sent if m != winner], sent, feature)
+        return self._won(winner, fallback), out
+
+    async def acall(self, send: Callable[[str, Callable[[], None]], Awaitable[T]], feature: str) -> Tuple[str, T]:
+        """asyncio version of call(); the losing request is cancelled."""
+        model, fallback, after = self.route(feature)
+        sent: Dict[str, float] = {}
+        sent_evt = asyncio.Event()
+
+        def on_send_for(m: str) -> Callable[[], None]:
+            def on_send():
+                if m not in sent:
+                    sent[m] = time.monotonic()
+                    if m == model:
+                        sent_evt.set()
+            return on_send
+
+        if fallback is None:
+            out = await send(model, on_send_for(model))
+            self.observe(model, feature, time.monotonic() - sent.get(model, time.monotonic()))
+            return model, out
+        tasks = {asyncio.ensure_future(send(model, on_send_for(model))): model}
+        pending, error = set(tasks), None
+        try:
+            # the hedge clock starts once the primary is actually out, not while it waits on our limiter
+            waiter = asyncio.ensure_future(sent_evt.wait())
+            await asyncio.wait(pending | {waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if sent_evt.is_set():
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, sent[model] + after - time.monotonic()))
+                if not done and self._can_hedge():
+                    tasks[asyncio.ensure_future(send(fallback, on_send_for(fallback)))] = fallback
+                    pending = set(tasks)
+                    self._hedged()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._settle(tasks[task], [tasks[t] for t in pending if tasks[t] in sent], sent, feature)
+                        return self._won(tasks[task], fallback), task.result()
+                    error = error or task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    def stream(self, open_stream: Callable[[str, Callable[[], None]], Iterable[T]],
+               feature: str) -> Tuple[str, Iterator[T]]:
+        """
+        (model, items) for a streamed request; open_stream(model, on_send) as
+        for call(). Blocks until the first item arrives; if the routed model
+        has not produced one by its p95 time-to-first-chunk after going out,
+        the fallback is opened too and the first to produce an item wins. The
+        loser is stopped at its next item.
+        """
+        model, fallback, after = self.route(feature, "first")
+        if fallback is None:
+            return model, self._observed(open_stream, model, feature)
+        q: "queue.Queue[Tuple[str, str, Any]]" = queue.Queue()
+        stops = {m: threading.Event() for m in (model, fallback)}
+        sent: Dict[str, float] = {}
+
+        def pump(m: str):
+            try:
+                for item in self._observed(open_stream, m, feature, stops[m], self._sender(q, m, sent)):
+                    q.put((m, "item", item))
+                q.put((m, "end", None))
+            except BaseException as e:
+                q.put((m, "error", e))
+
+        def start(m: str):
+            threading.Thread(target=pump, args=(m,), name="hedge-stream", daemon=True).start()
+
+        start(model)
+        msg = self._race(q, lambda: start(fallback), model, fallback, after, sent)
+        winner = msg[0]
+        for m, stop in stops.items():
+            if m != winner:
+                stop.set()
+        for m in sent:
+            if m != winner:
+                self.observe(m, feature, time.monotonic() - sent[m], "first")  # still silent (or failed): a lower bound
+
+        def rest(msg: Tuple[str, str, Any]) -> Iterator[T]:
+            try:
+                while True:
+                    m, kind, value = msg
+                    if m == winner:
+                        if kind == "item":
+                            yield value
+                        elif kind == "end":
+                            return
+                        elif kind == "error":
+                            raise value
+                    msg = q.get()
+            finally:
+                stops[winner].set()  # the reader went away: stop pumping
+
+        return self._won(winner, fallback), rest(msg)
+
+    def _observed(self, open_stream: Callable[[str, Callable[[], None]], Iterable[T]], model: str, feature: str,
+                  stop: Optional[threading.Event] = None, on_send: Optional[Callable[[], None]] = None) -> Iterator[T]:
+        sent: List[float] = []
+
+        def mark():
+            if not sent:
+                sent.append(time.monotonic())
+                if on_send is not None:
+                    on_send()
+
+        src = open_stream(model, mark)
+        started = sent[0] if sent else time.monotonic()
+        first = True
+        try:
+            for item in src:
+                if stop is not None and stop.is_set():
+                    return  # lost the race (already accounted for by stream()) or abandoned
+                if first:
+                    self.observe(model, feature, time.monotonic() - started, "first")
+                    first = False
+                yield item
+        finally:
+            close = getattr(src, "close", None)
+            if close is not None:
+                close()
+        self.observe(model, feature, time.monotonic() - started)
+
+    def _settle(self, winner: str, running: List[str], sent: Dict[str, float], feature: str):
+        """Latency samples when a hedged call resolves: the winner's time, and for a request still
+        running, the time so far as a lower bound. Otherwise a model that always loses the race
+        would never collect the samples that route it away."""
+        now = time.monotonic()
+        for m in [winner, *running]:
+            if m in sent:
+                self.observe(m, feature, now - sent[m])
+
+    def _hedged(self):
+        with self._lock:
+            self.hedges += 1
+
+    def _won(self, model: str, fallback: Optional[str]) -> str:
+        if model == fallback:
+            with self._lock:
+                self.hedge_wins += 1
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing state for dashboards: p95 seconds per (model, feature) and hedge counters."""
+        with self._lock:
+            p95 = {f"{m} / {f}": h.quantile(0.95) for (m, f, kind), h in self._latency.items() if kind == "total"}
+            return {"models": list(self.models), "hedges": self.hedges, "hedge_wins": self.hedge_wins, "p95": p95}
+
+# --------------------- Process-wide router ---------------------
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _router_lock:
+            if _pool is None:
+                # hedges only: primaries run on their caller's (or their own) thread
+                _pool = ThreadPoolExecutor(max_workers=max(1, GROQ_CONCURRENCY), thread_name_prefix="hedge")
+    return _pool
+
+def get_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                models = [m.strip() for m in GROQ_MODELS.split(",")] if GROQ_MODELS else [GROQ_MODEL]
+                _router = ModelRouter(models, parse_budgets(GROQ_LATENCY_BUDGETS), GROQ_HEDGE)
+    return _router
@@ -0,0 +1,201 @@
+# core/semcache.py
+#
+# Semantic cache for Academic Q&A (modules/qa.py): a question phrased
+# differently from one already answered in the same scope (domain and answer
+# guidance), e.g. "What is photosynthesis?" vs "explain photosynthesis", is
+# answered from the earlier reply instead of going back to Groq.
+# The exact-match response cache (core/cache.py) still covers identical requests.
+#
+# Env (set via .env or Streamlit Secrets):
+#   SEMANTIC_CACHE=1                 # 0 disables it
+#   SEMANTIC_CACHE_THRESHOLD=0.9     # cosine similarity needed for a hit (0..1)
+#   SEMANTIC_CACHE_CAPACITY=2000     # questions kept per server process
+#   SEMANTIC_CACHE_EVICTION=lru      # lru | lfu | fifo, applied once full
+#   SEMANTIC_CACHE_TTL_SEC=86400     # older answers are not served
+#
+# Everything is local: questions are embedded as feature-hashed word and
+# character 3-gram counts (filler words like "what is" / "explain" dropped),
+# L2-normalised into a fixed-size NumPy matrix, and a lookup is one
+# matrix-vector product over the rows in the same scope. Questions whose
+# numbers differ ("derivative of x^2" vs "x^3", "World War I" vs "II") never
+# match, and neither do questions that share their words but not their word
+# order ("is Python faster than C" vs "is C faster than Python"): a hit also
+# needs half of its word pairs (bigrams) in common with the cached question.
+
+import re, threading, time, zlib
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_CAPACITY, SEMANTIC_CACHE_EVICTION, SEMANTIC_CACHE_TTL_SEC,
+)
+
+EVICTION_POLICIES = ("lru", "lfu", "fifo")
+
+_DIM = 2048
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?|\b(?=[ivx]{2,}\b)x{0,3}(?:ix|iv|v?i{0,3})\b")  # digits, roman ii..xxxix
+_ORDER_MIN = 0.5  # bigram Jaccard needed on top of cosine similarity
+_FILLER = frozenset("""
+a an the is are was were be of to in on for and or with by about this that these those it its
+what which explain describe define definition meaning mean means please can could would you
+me tell give show briefly simple simply terms i my we do does did question help understand s
+""".split())
+
+def _stem(word: str) -> str:
+    """Crude plural/verb 's' folding: 'trees' -> 'tree', 'works' -> 'work' (not 'class')."""
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+def _words(text: str) -> List[str]:
+    return [_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in _FILLER]
+
+def _bigrams(text: str) -> FrozenSet[str]:
+    words = _words(text)
+    return frozenset("%s %s" % pair for pair in zip(words, words[1:]))
+
+def _same_order(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    """Word order check: bigram Jaccard >= _ORDER_MIN (two one-word questions always pass)."""
+    if not a and not b:
+        return True
+    return len(a & b) / len(a | b) >= _ORDER_MIN
+
+def _features(text: str) -> List[str]:
+    words = _words(text)
+    feats = ["w:" + w for w in words]
+    feats += ["b:%s %s" % pair for pair in zip(words, words[1:])]
+    for w in words:
+        padded = f" {w} "
+        feats += ["c:" + padded[i:i + 3] for i in range(len(padded) - 2)]
+    return feats
+
+def embed(text: str, dim: int = _DIM) -> np.ndarray:
+    """L2-normalised signed feature-hashing vector (float32); all zeros for an empty question."""
+    vec = np.zeros(dim, dtype=np.float32)
+    feats = _features(text)
+    if not feats:
+        return vec
+    h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.uint32, count=len(feats))
+    np.add.at(vec, (h % dim).astype(np.intp), np.where(h & 0x80000000, -1.0, 1.0).astype(np.float32))
+    # sublinear counts, so one repeated word does not dominate
+    vec = np.sign(vec) * np.log1p(np.abs(vec))
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+def _numbers(text: str) -> Tuple[str, ...]:
+    return tuple(sorted(_NUMBER_RE.findall(text.lower())))
+
+class SemanticCache:
+    """
+    Fixed-capacity table of (scope, question vector, answer). lookup() returns
+    the stored answer of the most similar question in the same scope at or
+    above 'threshold'. Thread-safe; per process.
+    """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_CAPACITY, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 eviction: str = SEMANTIC_CACHE_EVICTION, ttl: float = SEMANTIC_CACHE_TTL_SEC, dim: int = _DIM):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"SEMANTIC_CACHE_EVICTION must be one of {EVICTION_POLICIES}, not {eviction!r}")
+        self.capacity, self.threshold, self.eviction, self.ttl = max(1, capacity), threshold, eviction, ttl
+        self._vecs = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._scope = np.full(self.capacity, -1, dtype=np.int32)        # -1 = free slot
+        self._created = np.zeros(self.capacity, dtype=np.float64)
+        self._used = np.zeros(self.capacity, dtype=np.float64)          # last hit or store (lru)
+        self._hits = np.zeros(self.capacity, dtype=np.int64)            # hits so far (lfu)
+        self._answers: List[Optional[str]] = [None] * self.capacity
+        self._numbers: List[Tuple[str, ...]] = [()] * self.capacity
+        self._bigrams: List[FrozenSet[str]] = [frozenset()] * self.capacity
+        self._scopes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _scope_id(self, scope: str) -> int:
+        return self._scopes.setdefault(scope, len(self._scopes))
+
+    def _best(self, scope_id: int, vec: np.ndarray, numbers: Tuple[str, ...], bigrams: FrozenSet[str],
+              now: float) -> Tuple[int, float]:
+        """(slot, similarity) of the closest live entry in scope with the same numbers and word order; (-1, 0.0) if none."""
+        rows = np.flatnonzero((self._scope == scope_id) & (now - self._created <= self.ttl))
+        if not len(rows):
+            return -1, 0.0
+        sims = self._vecs[rows] @ vec
+        for i in np.argsort(-sims):
+            if self._numbers[rows[i]] == numbers and _same_order(self._bigrams[rows[i]], bigrams):
+                return int(rows[i]), float(sims[i])
+        return -1, 0.0
+
+    def lookup(self, scope: str, question: str) -> Optional[str]:
+        vec = embed(question, self._vecs.shape[1])
+        now = time.time()
+        with self._lock:
+            slot, sim = (self._best(self._scope_id(scope), vec, _numbers(question), _bigrams(question), now)
+                         if vec.any() else (-1, 0.0))
+            if slot < 0 or sim < self.threshold:
+                self._counts["misses"] += 1
+                return None
+            self._counts["hits"] += 1
+            self._used[slot] = now
+            self._hits[slot] += 1
+            return self._answers[slot]
+
+    def put(self, scope: str, question: str, answer: str):
+        if not answer:
+            return
+        vec = embed(question, self._vecs.shape[1])
+        if not vec.any():
+            return
+        now = time.time()
+        numbers, bigrams = _numbers(question), _bigrams(question)
+        with self._lock:
+            scope_id = self._scope_id(scope)
+            slot, sim = self._best(scope_id, vec, numbers, bigrams, now)
+            if slot < 0 or sim < 0.999:  # not the same question again: new slot
+                slot = self._free_slot(now)
+            self._vecs[slot] = vec
+            self._scope[slot] = scope_id
+            self._created[slot] = self._used[slot] = now
+            self._hits[slot] = 0
+            self._answers[slot] = answer
+            self._numbers[slot] = numbers
+            self._bigrams[slot] = bigrams
+            self._counts["stores"] += 1
+
+    def _free_slot(self, now: float) -> int:
+        dead = (self._scope < 0) | (now - self._created > self.ttl)
+        free = np.flatnonzero(dead)
+        if len(free):
+            return int(free[0])
+        if self.eviction == "lru":
+            slot = int(np.argmin(self._used))
+        elif self.eviction == "lfu":
+            slot = int(np.lexsort((self._used, self._hits))[0])  # fewest hits, then least recent
+        else:
+            slot = int(np.argmin(self._created))
+        self._counts["evictions"] += 1
+        return slot
+
+    def clear(self):
+        with self._lock:
+            self._scope[:] = -1
+            self._answers = [None] * self.capacity
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counts)
+            out["entries"] = int((self._scope >= 0).sum())
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+# --------------------- Process-wide cache ---------------------
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache()
+    return _cache
@@ -2,6 +2,7 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
 from .utils import get_usage_counts
+from .prewarm import start_prewarm
 
 # Fallback: hide Streamlit's default sidebar page list (inject_css() should do this earlier)
 HIDE_DEFAULT_SIDEBAR = """
@@ -47,6 +48,9 @@ def render_sidebar(active: str = "Home"):
     Renders a custom sidebar with consistent highlighting and robust switching.
     Pass the exact label for the current page, e.g., render_sidebar("Coding Mentor").
     """
+    # Fill the response cache with preset answers in the background (once per process)
+    start_prewarm()
+
     # Backup hide (primary hide is done early in inject_css())
     st.markdown(HIDE_DEFAULT_SIDEBAR, unsafe_allow_html=True)
 
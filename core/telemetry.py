@@ -0,0 +1,120 @@
+# core/telemetry.py
+#
+# In-process latency and token accounting for every model call: Groq chat
+# completions (core/models_groq.py) and Hugging Face inference requests
+# (core/models_hf.py). The home page dashboard reads snapshot().
+#
+# Each call is recorded under (provider, feature) with:
+#   wall        seconds from the call until the answer (or error) was complete
+#   queue       seconds spent waiting before a request went out: rate-limiter
+#               waits and retry backoff (Groq), cold-model waits (HF)
+#   tokens      prompt and completion tokens, as reported by the provider
+#   model, outcome
+# outcome is "ok" or "error" for calls that reached the provider; requests
+# answered by the response cache ("cached") or by joining an identical call
+# in flight ("coalesced") are counted but kept out of the latency histograms.
+#
+# Histograms use fixed log-spaced buckets (10% apart, 1 ms .. ~11 min), so
+# p50/p95/p99 cost O(buckets) in memory however many calls are recorded.
+# Numbers are per server process and reset on restart.
+
+import bisect, threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+_BOUNDS = [0.001 * 1.1 ** i for i in range(142)]  # upper bucket edges in seconds, 1 ms .. ~11 min
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Histogram:
+    """Counts per log-spaced bucket; quantile() answers within one bucket (~10%)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.counts[bisect.bisect_left(_BOUNDS, value)] += 1
+        self.n += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.n:
+            return None
+        rank, seen = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(_BOUNDS[i] if i < len(_BOUNDS) else self.max, self.max)
+        return self.max
+
+class _Series:
+    def __init__(self):
+        self.wall = Histogram()
+        self.queue = Histogram()
+        self.outcomes: Counter = Counter()
+        self.models: Counter = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+class Telemetry:
+    """Thread-safe registry of per-(provider, feature) series."""
+
+    def __init__(self):
+        self._series: Dict[tuple, _Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, feature: str, model: str, wall: float, queue: float = 0.0,
+               prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None, outcome: str = "ok"):
+        with self._lock:
+            s = self._series.get((provider, feature))
+            if s is None:
+                s = self._series[(provider, feature)] = _Series()
+            s.outcomes[outcome] += 1
+            if outcome not in ("ok", "error"):
+                return
+            s.models[model] += 1
+            s.wall.add(wall)
+            s.queue.add(queue)
+            s.prompt_tokens += prompt_tokens or 0
+            s.completion_tokens += completion_tokens or 0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """One row per (provider, feature), busiest first; latencies in milliseconds (None before the first call)."""
+        rows = []
+        with self._lock:
+            for (provider, feature), s in self._series.items():
+                row: Dict[str, Any] = {
+                    "provider": provider, "feature": feature,
+                    "calls": s.wall.n, "errors": s.outcomes["error"],
+                    "cached": s.outcomes["cached"], "coalesced": s.outcomes["coalesced"],
+                }
+                for q in QUANTILES:
+                    v = s.wall.quantile(q)
+                    row[f"p{round(q * 100)}_ms"] = None if v is None else v * 1000
+                v = s.queue.quantile(0.95)
+                row["queue_p95_ms"] = None if v is None else v * 1000
+                row["prompt_tokens"], row["completion_tokens"] = s.prompt_tokens, s.completion_tokens
+                row["model"] = s.models.most_common(1)[0][0] if s.models else ""
+                rows.append(row)
+        rows.sort(key=lambda r: -(r["calls"] + r["cached"] + r["coalesced"]))
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+# --------------------- Process-wide registry ---------------------
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+def get_telemetry() -> Telemetry:
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = Telemetry()
+    return _telemetry
@@ -1,12 +1,10 @@
-import json, os, time, re
+import json, time, re
 import streamlit as st
-from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, List
 from .config import PALETTE
+from .analytics import DATA_DIR, get_store, record
 
-DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
-LOG_FILE = DATA_DIR / "analytics.json"
 
 def inject_css():
     st.markdown(f"""
@@ -58,30 +56,62 @@ def inject_css():
     </style>
     """, unsafe_allow_html=True)
 
-def _load_log() -> Dict[str, Any]:
-    if LOG_FILE.exists():
-        try:
-            return json.loads(LOG_FILE.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
+def answer_card(text: str, subtitle: str="") -> str:
+    """HTML of the bordered answer card the pages show model output in."""
+    head = f'<div class="subtle" style="margin-bottom:6px">{subtitle}</div>' if subtitle else ""
+    return f"""
+<div class="card" style="border-left: 4px solid rgba(0,194,209,.65);">
+  {head}<div style="line-height:1.6;white-space:pre-wrap">{text}</div>
+</div>
+"""
 
-def _save_log(obj: Dict[str, Any]):
-    LOG_FILE.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+def stream_html(chunks: Iterable[str], render: Callable[[str], str], min_interval: float=0.05) -> str:
+    """
+    Progressive output for streamed answers: re-renders render(text so far)
+    into one placeholder (at most every 'min_interval' seconds, with a cursor)
+    and returns the full text once the stream ends.
+    """
+    box = st.empty()
+    box.markdown(render("▌"), unsafe_allow_html=True)
+    parts: List[str] = []
+    last = time.monotonic()
+    for piece in chunks:
+        parts.append(piece)
+        if time.monotonic() - last >= min_interval:
+            box.markdown(render("".join(parts) + "▌"), unsafe_allow_html=True)
+            last = time.monotonic()
+    text = "".join(parts)
+    box.markdown(render(text), unsafe_allow_html=True)
+    return text
+
+def stream_items(items: Iterable[Any], render: Callable[[int, Any], str], status: str="") -> List[Any]:
+    """
+    Progressive preview for streamed lists (quiz questions, flashcards): shows
+    render(i, item) markdown for each item as it arrives, then clears the
+    preview and returns every item so the page can draw the interactive version.
+    """
+    box = st.empty()
+    out: List[Any] = []
+    with box.container():
+        if status:
+            st.caption(status)
+        for item in items:
+            out.append(item)
+            st.markdown(render(len(out), item))
+    box.empty()
+    return out
 
 def record_event(event_type: str, payload: Dict[str, Any]):
-    log = _load_log()
-    ts = str(int(time.time()))
-    log[ts] = {"event": event_type, "payload": payload}
-    _save_log(log)
+    # returns immediately; the background writer batches it to disk
+    record(event_type, payload)
 
 def get_usage_counts():
-    log = _load_log()
+    # O(1): reads the counters record maintained by every record_event
+    by_type, total = get_store().counts()
     stats = {"qna":0, "coding":0, "summaries":0, "transcripts":0, "wellness":0, "quiz":0}
-    for _, v in log.items():
-        e = v.get("event")
-        if e in stats: stats[e]+=1
-    return stats, len(log)
+    for e in stats:
+        stats[e] = int(by_type.get(e, 0))
+    return stats, total
 
 def parse_json_maybe(s: str):
     try:
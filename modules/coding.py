@@ -1,15 +1,352 @@
-from core.models_groq import chat
+import ast, hashlib, io, json, re, threading, zipfile
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from core.cache import DiskCache
+from core.config import (
+    CODE_REVIEW_CHUNK_CHARS, DATA_DIR, PROJECT_REVIEW_CACHE_MAX_BYTES, PROJECT_REVIEW_MAX_FILE_BYTES,
+    PROJECT_REVIEW_MAX_FILES,
+)
+from core.models_groq import chat, chat_many, chat_stream, forget, model_key
 
-def code_review(code: str, lang: str="python") -> str:
+# stream=True returns an iterator of text pieces (see chat_stream) instead of the full answer
+
+def code_review(code: str, lang: str="python", stream: bool=False) -> Union[str, Iterator[str]]:
     system = "You are a senior code reviewer. Provide specific, safe improvements and explain why."
     user = f"Language: {lang}\nCode:\n{code}\n\nReturn: issues, fixes, and improved snippet if applicable."
-    return chat(system, user, temperature=0.2)
+    return (chat_stream if stream else chat)(system, user, temperature=0.2, feature="coding.review")
 
-def debug_help(error: str, snippet: str="", lang: str="python") -> str:
+def debug_help(error: str, snippet: str="", lang: str="python", stream: bool=False) -> Union[str, Iterator[str]]:
     system = "You are a debugging assistant. Diagnose root causes and propose fixes."
     user = f"Language: {lang}\nError:\n{error}\nSnippet:\n{snippet}"
-    return chat(system, user, temperature=0.2)
+    return (chat_stream if stream else chat)(system, user, temperature=0.2, feature="coding.debug")
 
-def concept_explain(concept: str, lang: str="python") -> str:
+def concept_explain(concept: str, lang: str="python", stream: bool=False) -> Union[str, Iterator[str]]:
     system = "Explain programming concepts with short examples and clarity."
-    return chat(system, concept, temperature=0.2)
+    return (chat_stream if stream else chat)(system, concept, temperature=0.2, feature="coding.concept")
+
+# --------------------- Chunked review (large files) ---------------------
+
+REVIEW_CHUNK_SYSTEM = ("You are a senior code reviewer. You see one section of a larger file. "
+                       "Report concrete issues in this section only, as JSON.")
+SEVERITIES = ("high", "medium", "low")
+
+# (first line, last line, label): 1-based, inclusive
+Unit = Tuple[int, int, str]
+
+def _python_units(nodes: List[ast.stmt], lines: List[str], lo: int, hi: int, max_chars: int) -> List[Unit]:
+    """Top-level statements of lines lo..hi as units; comments and blank lines go with the statement after them."""
+    units: List[Unit] = []
+    start = lo
+    for i, node in enumerate(nodes):
+        end = hi if i == len(nodes) - 1 else node.end_lineno
+        label = getattr(node, "name", "")
+        size = sum(len(l) + 1 for l in lines[start - 1:end])
+        if isinstance(node, ast.ClassDef) and size > max_chars and node.body:
+            # too big for one chunk: the class header, then its methods one by one
+            body_start = node.body[0].lineno
+            if getattr(node.body[0], "decorator_list", None):
+                body_start = min(body_start, *(d.lineno for d in node.body[0].decorator_list))
+            units.append((start, body_start - 1, label))
+            units += [(a, b, f"{label}.{sub}" if sub else label)
+                      for a, b, sub in _python_units(node.body, lines, body_start, end, max_chars)]
+        else:
+            units.append((start, end, label))
+        start = end + 1
+    return units
+
+_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$')
+
+def _brace_units(lines: List[str]) -> List[Unit]:
+    """Brace heuristic for C-like languages: a unit ends where nesting is back to 0 after a '}', ';' or blank line."""
+    units: List[Unit] = []
+    depth, start = 0, 1
+    for n, line in enumerate(lines, 1):
+        bare = _STRING_RE.sub("", line)
+        depth = max(0, depth + bare.count("{") - bare.count("}"))
+        stripped = bare.strip()
+        if depth == 0 and (not stripped or stripped.endswith(("}", ";", "};"))):
+            units.append((start, n, ""))
+            start = n + 1
+    if start <= len(lines):
+        units.append((start, len(lines), ""))
+    return units
+
+def split_code(code: str, lang: str="python", max_chars: int=CODE_REVIEW_CHUNK_CHARS) -> List[Unit]:
+    """
+    Split 'code' into chunks of at most ~max_chars at function/class boundaries:
+    the AST for Python (falling back to the brace heuristic if it does not
+    parse), brace nesting for the other languages. A single unit larger
+    than max_chars is cut at line boundaries.
+    """
+    lines = code.splitlines()
+    if not lines:
+        return []
+    units: List[Unit] = []
+    if lang == "python":
+        try:
+            tree = ast.parse(code)
+            units = _python_units(tree.body, lines, 1, len(lines), max_chars) if tree.body else []
+        except (SyntaxError, ValueError):
+            units = []
+    if not units:
+        units = _brace_units(lines)
+
+    def close(first: int, last: int, labels: List[str]) -> Unit:
+        names = list(dict.fromkeys(l for l in labels if l))
+        more = f" +{len(names) - 3} more" if len(names) > 3 else ""
+        return first, last, ", ".join(names[:3]) + more
+
+    chunks: List[Unit] = []
+    cur: Optional[List[Any]] = None  # [first, last, labels, chars]
+    for a, b, label in units:
+        size = sum(len(l) + 1 for l in lines[a - 1:b])
+        if cur and cur[3] + size <= max_chars:
+            cur[1], cur[3] = b, cur[3] + size
+            cur[2].append(label)
+            continue
+        if cur:
+            chunks.append(close(*cur[:3]))
+            cur = None
+        if size <= max_chars:
+            cur = [a, b, [label], size]
+            continue
+        piece_start, piece_chars = a, 0
+        for n in range(a, b + 1):
+            piece_chars += len(lines[n - 1]) + 1
+            if piece_chars >= max_chars or n == b:
+                chunks.append((piece_start, n, label))
+                piece_start, piece_chars = n + 1, 0
+    if cur:
+        chunks.append(close(*cur[:3]))
+    return chunks
+
+def _chunk_prompt(lines: List[str], first: int, last: int, label: str, lang: str, notes: str) -> str:
+    numbered = "\n".join(f"{n:>5} | {lines[n - 1]}" for n in range(first, last + 1))
+    return f"""Language: {lang}
+Section: lines {first}-{last}{f" ({label})" if label else ""}
+{notes.strip()}
+Code (line numbers on the left):
+{numbered}
+
+Return JSON: {{"findings": [{{"line": 0, "severity": "high|medium|low", "title": "short issue name",
+"detail": "what is wrong and why", "fix": "concrete fix"}}]}}
+Use [] when the section has no real issues. Do not report code you cannot see."""
+
+def _title_key(title: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9 ]+", " ", title.lower()).split())
+
+def _merge_findings(results: List[Tuple[Unit, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    Findings from every chunk, deduplicated by normalized title (line numbers
+    merged, highest severity kept), plus the indexes of chunks whose answer was unusable.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    failed = []
+    for i, ((first, last, _label), out) in enumerate(results):
+        try:
+            obj = None if isinstance(out, Exception) else json.loads(out)
+        except ValueError:
+            obj = None
+        if not isinstance(obj, dict) or not isinstance(obj.get("findings"), list):
+            failed.append(i)
+            continue
+        for f in obj["findings"]:
+            if not isinstance(f, dict) or not str(f.get("title") or "").strip():
+                continue
+            key = _title_key(f["title"])
+            sev = str(f.get("severity", "")).lower()
+            sev = sev if sev in SEVERITIES else "low"
+            line = f.get("line") if isinstance(f.get("line"), int) and first <= f["line"] <= last else first
+            seen = merged.get(key)
+            if seen is None:
+                merged[key] = {"title": f["title"].strip(), "severity": sev, "lines": [line],
+                               "detail": str(f.get("detail") or "").strip(), "fix": str(f.get("fix") or "").strip()}
+            else:
+                seen["lines"].append(line)
+                if SEVERITIES.index(sev) < SEVERITIES.index(seen["severity"]):
+                    seen["severity"] = sev
+    findings = sorted(merged.values(), key=lambda f: (SEVERITIES.index(f["severity"]), min(f["lines"])))
+    return findings, failed
+
+def _review_files(files: List[Tuple[str, str]], notes: str, max_chars: int
+                  ) -> List[Tuple[List[Unit], List[Dict[str, Any]], List[int]]]:
+    """
+    (chunks, merged findings, failed chunk indexes) for each (code, lang),
+    with the chunks of every file reviewed in one parallel chat_many() batch.
+    Unusable answers are dropped from the response cache so a retry asks again;
+    if every request raised, the first error is raised.
+    """
+    plans = []
+    for code, lang in files:
+        lines = code.splitlines()
+        chunks = split_code(code, lang, max_chars)
+        plans.append((chunks, [_chunk_prompt(lines, a, b, label, lang, notes) for a, b, label in chunks]))
+    prompts = [p for _, ps in plans for p in ps]
+    results = chat_many([dict(system_prompt=REVIEW_CHUNK_SYSTEM, user_prompt=p, json_mode=True,
+                              feature="coding.review") for p in prompts])
+    errors = [r for r in results if isinstance(r, Exception)]
+    if results and len(errors) == len(results):
+        raise errors[0]
+    out, at = [], 0
+    for chunks, ps in plans:
+        rs = results[at:at + len(ps)]
+        at += len(ps)
+        findings, failed = _merge_findings(list(zip(chunks, rs)))
+        for i in failed:
+            if not isinstance(rs[i], Exception):
+                forget(REVIEW_CHUNK_SYSTEM, ps[i], json_mode=True)
+        out.append((chunks, findings, failed))
+    return out
+
+def _findings_markdown(findings: List[Dict[str, Any]]) -> List[str]:
+    out = []
+    for sev in SEVERITIES:
+        group = [f for f in findings if f["severity"] == sev]
+        if not group:
+            continue
+        out.append(f"\n**{sev.capitalize()} ({len(group)})**")
+        for f in group:
+            lines = sorted(set(f["lines"]))
+            out.append(f"- **{f['title']}** (line{'s' if len(lines) > 1 else ''} {', '.join(map(str, lines))}) — {f['detail']}")
+            if f["fix"]:
+                out.append(f"  - Fix: {f['fix']}")
+    return out
+
+def chunked_review(code: str, lang: str="python", notes: str="", max_chars: int=CODE_REVIEW_CHUNK_CHARS) -> str:
+    """
+    Map-reduce review for files too large for one prompt: split_code() chunks
+    are reviewed in parallel (chat_many) as JSON findings, which are merged
+    and deduplicated into one Markdown report. 'notes' (reviewer focus,
+    tone) is added to every chunk's prompt.
+    """
+    [(chunks, findings, failed)] = _review_files([(code, lang)], notes, max_chars)
+    out = [f"### Review of {len(code.splitlines())} lines in {len(chunks)} sections — {len(findings)} finding(s)"]
+    out += _findings_markdown(findings) or ["\nNo issues found."]
+    if failed:
+        where = ", ".join(f"lines {chunks[i][0]}-{chunks[i][1]}" for i in failed)
+        out.append(f"\n_Could not review {where}. Run the review again to retry._")
+    return "\n".join(out)
+
+# --------------------- Project review (zip / folder) ---------------------
+
+# file extension -> language named in the review prompt
+SOURCE_LANGS = {
+    ".py": "python", ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".ts": "typescript",
+    ".tsx": "typescript", ".java": "java", ".kt": "kotlin", ".c": "c", ".h": "c", ".cc": "c++", ".cpp": "c++",
+    ".cxx": "c++", ".hpp": "c++", ".cs": "c#", ".go": "go", ".rs": "rust", ".php": "php", ".rb": "ruby",
+    ".swift": "swift", ".scala": "scala",
+}
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", "env", "dist", "build",
+             "target", ".idea", ".vscode", ".mypy_cache", ".pytest_cache", "vendor"}
+
+# bump when the review prompt changes, so cached file reviews are not reused
+_REVIEW_VERSION = 1
+
+def project_files(uploads: List[Tuple[str, bytes]], max_files: int=PROJECT_REVIEW_MAX_FILES,
+                  max_bytes: int=PROJECT_REVIEW_MAX_FILE_BYTES) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Source files to review from uploaded (name, bytes): .zip archives are
+    expanded, anything else is taken as one file of a folder upload.
+    Returns ({path: text}, [skipped path: reason]); vendored/build folders
+    and unknown extensions are ignored silently.
+    """
+    entries: List[Tuple[str, int, Callable[[], bytes]]] = []
+    for name, data in uploads:
+        if name.lower().endswith(".zip"):
+            try:
+                zf = zipfile.ZipFile(io.BytesIO(data))
+            except zipfile.BadZipFile:
+                entries.append((name, -1, lambda: b""))
+                continue
+            for info in zf.infolist():
+                if not info.is_dir():
+                    entries.append((info.filename, info.file_size, lambda zf=zf, info=info: zf.read(info)))
+        else:
+            entries.append((name, len(data), lambda data=data: data))
+
+    files: Dict[str, str] = {}
+    skipped: List[str] = []
+    for path, size, read in sorted(entries, key=lambda e: e[0]):
+        path = path.replace("\\", "/").lstrip("/")
+        parts = path.split("/")
+        if size < 0:
+            skipped.append(f"{path}: not a valid zip archive")
+            continue
+        if any(p in SKIP_DIRS for p in parts[:-1]) or PurePosixPath(path).suffix.lower() not in SOURCE_LANGS:
+            continue
+        if size > max_bytes:
+            skipped.append(f"{path}: larger than {max_bytes // 1024} KB")
+        elif len(files) >= max_files:
+            skipped.append(f"{path}: over the {max_files}-file limit")
+        else:
+            try:
+                files[path] = read().decode("utf-8")
+            except UnicodeDecodeError:
+                skipped.append(f"{path}: not UTF-8 text")
+    return files, skipped
+
+def _file_review_key(text: str, lang: str, notes: str, max_chars: int) -> str:
+    raw = json.dumps([_REVIEW_VERSION, model_key(), lang, notes, max_chars, text], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def project_review(files: Dict[str, str], notes: str="", max_chars: int=CODE_REVIEW_CHUNK_CHARS) -> Dict[str, Any]:
+    """
+    Review every file of a project and return {'report': Markdown, 'files',
+    'reviewed', 'cached', 'findings'}. Each file's findings are cached by a
+    hash of its content (plus language and notes) in
+    DATA_DIR/file_reviews.db, so after an edit only the changed files are
+    sent to Groq; identical files are reviewed once. Changed files are
+    chunked like chunked_review() and all their chunks go out in one
+    parallel batch.
+    """
+    cache = _file_review_cache()
+    keys = {path: _file_review_key(text, SOURCE_LANGS[PurePosixPath(path).suffix.lower()], notes, max_chars)
+            for path, text in files.items()}
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    for key in set(keys.values()):
+        row = cache.get(key)
+        if row is not None:
+            results[key] = json.loads(row[1])
+    cached = sum(1 for k in keys.values() if k in results)
+
+    todo: Dict[str, str] = {}  # key -> one path with that content
+    for path, key in keys.items():
+        if key not in results:
+            todo.setdefault(key, path)
+    failed: Dict[str, List[str]] = {}  # key -> line ranges that could not be reviewed, for every path with that content
+    if todo:
+        reviews = _review_files([(files[p], SOURCE_LANGS[PurePosixPath(p).suffix.lower()]) for p in todo.values()],
+                                notes, max_chars)
+        for key, (chunks, findings, bad) in zip(todo, reviews):
+            results[key] = findings
+            if bad:
+                failed[key] = [f"{chunks[i][0]}-{chunks[i][1]}" for i in bad]
+            else:
+                cache.put(key, json.dumps(findings, ensure_ascii=False))
+
+    total = sum(len(results[k]) for k in keys.values())
+    out = [f"### Project review — {len(files)} file(s), {total} finding(s)"]
+    for path in sorted(files):
+        findings = results[keys[path]]
+        if findings or keys[path] in failed:
+            out.append(f"\n#### `{path}` — {len(findings)} finding(s)")
+            out += _findings_markdown(findings)
+            if keys[path] in failed:
+                out.append(f"\n_Could not review lines {', '.join(failed[keys[path]])}. Run the review again to retry._")
+    clean = [p for p in sorted(files) if not results[keys[p]] and keys[p] not in failed]
+    if clean:
+        out.append(f"\n**No issues found in:** {', '.join(f'`{p}`' for p in clean)}")
+    return {"report": "\n".join(out), "files": len(files), "reviewed": len(files) - cached,
+            "cached": cached, "findings": total}
+
+_review_cache: Optional[DiskCache] = None
+_review_cache_lock = threading.Lock()
+
+def _file_review_cache() -> DiskCache:
+    global _review_cache
+    if _review_cache is None:
+        with _review_cache_lock:
+            if _review_cache is None:
+                _review_cache = DiskCache(Path(DATA_DIR) / "file_reviews.db", PROJECT_REVIEW_CACHE_MAX_BYTES,
+                                          ttl=float("inf"))
+    return _review_cache
@@ -1,7 +1,8 @@
-from typing import Dict, Any
-from core.models_groq import chat
+from typing import Dict, Any, Iterator, Union
+from core.models_groq import chat, chat_stream, stream_json_items
 
-def study_plan(name: str, course: str, grade: str, goals: str, hours_per_week: int=6) -> str:
+def study_plan(name: str, course: str, grade: str, goals: str, hours_per_week: int=6,
+               stream: bool=False) -> Union[str, Iterator[str]]:
     system = "You design concise, actionable study plans."
     user = f"""
 Student: {name}
@@ -17,13 +18,17 @@ Produce:
 - Risks & mitigation
 Keep it compact and practical.
 """
-    return chat(system, user, temperature=0.3)
+    return (chat_stream if stream else chat)(system, user, temperature=0.3, feature="plan")
 
-def flashcards(topic: str, n: int=10) -> str:
+def flashcards(topic: str, n: int=10, stream: bool=False) -> Union[str, Iterator[Dict[str, Any]]]:
+    """Flashcard JSON text, or with stream=True each {"front", "back"} card as soon as it arrives."""
     system = "You create compact flashcards as JSON."
     user = f"""
 Create {n} flashcards for topic "{topic}".
 Return JSON: {{"topic": "...", "cards":[{{"front":"", "back":""}}]}}
 Keep the back short and factual. Only JSON.
 """
-    return chat(system, user, json_mode=True)
+    if stream:
+        return (c for c in stream_json_items(system, user, "cards", feature="flashcards")
+                if isinstance(c, dict) and str(c.get("front") or "").strip())
+    return chat(system, user, json_mode=True, feature="flashcards")
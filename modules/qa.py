@@ -1,5 +1,138 @@
-from core.models_groq import chat
+import logging
+from typing import Any, Dict, Iterator, List, Union
+from core.config import QA_CONTEXT_TOKENS, QA_SUMMARY_TOKENS, SEMANTIC_CACHE
+from core.models_groq import chat, chat_stream
+from core.ratelimit import estimate_tokens
+from core.semcache import get_semantic_cache
 
-def academic_qa(question: str, domain: str="general") -> str:
-    system = f"You are a precise academic Q&A tutor for {domain}. Cite concepts, keep it concise."
-    return chat(system, question, temperature=0.2)
+log = logging.getLogger(__name__)
+
+def _system(domain: str) -> str:
+    return f"You are a precise academic Q&A tutor for {domain}. Cite concepts, keep it concise."
+
+def academic_qa(question: str, domain: str="general", stream: bool=False,
+                guidance: str="") -> Union[str, Iterator[str]]:
+    """
+    Answer 'question' (with optional answer-style 'guidance' appended to the prompt).
+    A near-duplicate of a question already answered with the same domain and
+    guidance is served from the semantic cache (core/semcache.py).
+    """
+    system = _system(domain)
+    prompt = f"{question}\n\nGuidance: {guidance}" if guidance else question
+    if not SEMANTIC_CACHE:
+        return (chat_stream if stream else chat)(system, prompt, temperature=0.2, feature="qna")
+    scope = f"{domain}\n{guidance}"
+    hit = get_semantic_cache().lookup(scope, question)
+    if hit is not None:
+        return iter([hit]) if stream else hit
+    if stream:
+        return _remember(chat_stream(system, prompt, temperature=0.2, feature="qna"), scope, question)
+    out = chat(system, prompt, temperature=0.2, feature="qna")
+    get_semantic_cache().put(scope, question, out)
+    return out
+
+def _remember(pieces: Iterator[str], scope: str, question: str) -> Iterator[str]:
+    """Pass a streamed answer through, caching it once complete."""
+    parts = []
+    for piece in pieces:
+        parts.append(piece)
+        yield piece
+    get_semantic_cache().put(scope, question, "".join(parts))
+
+# --------------------- Multi-turn conversations ---------------------
+# A conversation is a plain dict kept in st.session_state:
+#   {"summary": str, "turns": [(question, answer), ...], "compactions": int}
+# Each follow-up is sent with the rolling summary plus as many of the newest
+# turns as fit in QA_CONTEXT_TOKENS, so prompt size (and latency) stays flat
+# however long the session runs. Once the stored turns outgrow the budget,
+# the oldest are folded into the summary by one extra Groq call; the summary
+# itself is capped at QA_SUMMARY_TOKENS.
+
+SUMMARY_SYSTEM = "You maintain a running summary of a tutoring conversation. Return only the summary text."
+
+def new_conversation() -> Dict[str, Any]:
+    return {"summary": "", "turns": [], "compactions": 0}
+
+def _tokens(text: str) -> int:
+    return estimate_tokens(text, completion=0)
+
+def _clip(text: str, tokens: int) -> str:
+    """At most ~'tokens' tokens of 'text' (same 4 chars/token estimate as the rate limiter)."""
+    limit = max(0, tokens) * 4
+    return text if len(text) <= limit else text[:max(0, limit - 1)].rstrip() + "…"
+
+def _turn_text(question: str, answer: str) -> str:
+    return f"Student: {question}\nTutor: {answer}"
+
+def context_window(convo: Dict[str, Any], budget: int=QA_CONTEXT_TOKENS) -> str:
+    """Summary plus the newest turns that fit in 'budget' tokens; the newest turn is clipped rather than dropped."""
+    summary = _clip(convo["summary"], min(QA_SUMMARY_TOKENS, budget))
+    left = budget - _tokens(summary)
+    recent: List[str] = []
+    for question, answer in reversed(convo["turns"]):
+        text = _turn_text(question, answer)
+        if _tokens(text) > left:
+            if not recent and left > 0:
+                recent.append(_clip(text, left))
+            break
+        recent.append(text)
+        left -= _tokens(text)
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    if recent:
+        parts.append("Most recent turns:\n" + "\n\n".join(reversed(recent)))
+    return "\n\n".join(parts)
+
+def conversation_qa(question: str, convo: Dict[str, Any], domain: str="general", stream: bool=False,
+                    guidance: str="") -> Union[str, Iterator[str]]:
+    """
+    academic_qa() for a follow-up in 'convo': the question is sent with the
+    bounded context from context_window(). The opening question has no
+    context and goes through academic_qa() (and its semantic cache).
+    Call add_turn() with the answer once it is complete.
+    """
+    context = context_window(convo)
+    if not context:
+        return academic_qa(question, domain, stream=stream, guidance=guidance)
+    system = _system(domain) + " This is a continuing conversation: resolve follow-ups against it."
+    prompt = f"{context}\n\nCurrent question:\n{question}"
+    if guidance:
+        prompt += f"\n\nGuidance: {guidance}"
+    return (chat_stream if stream else chat)(system, prompt, temperature=0.2, feature="qna")
+
+def add_turn(convo: Dict[str, Any], question: str, answer: str, budget: int=QA_CONTEXT_TOKENS):
+    """
+    Record a finished turn. When the stored turns no longer fit next to the
+    summary, the oldest are folded into it until the rest use at most half
+    of what is left, so compaction runs every few turns rather than every turn.
+    """
+    convo["turns"].append((question, answer))
+    room = budget - QA_SUMMARY_TOKENS
+    sizes = [_tokens(_turn_text(q, a)) for q, a in convo["turns"]]
+    if sum(sizes) <= room or len(sizes) < 2:
+        return
+    fold = 0
+    while fold < len(sizes) - 1 and sum(sizes[fold:]) > room // 2:
+        fold += 1
+    old, convo["turns"] = convo["turns"][:fold], convo["turns"][fold:]
+    convo["summary"] = _compact(convo["summary"], old)
+    convo["compactions"] += 1
+
+def _compact(summary: str, turns: List[tuple]) -> str:
+    """Previous summary + turns -> new summary within QA_SUMMARY_TOKENS."""
+    words = max(20, QA_SUMMARY_TOKENS * 3 // 4)
+    # the folded turns can be long: cap the input so this call stays small as well
+    share = max(50, (QA_CONTEXT_TOKENS * 2) // max(1, len(turns)))
+    transcript = "\n\n".join(_clip(_turn_text(q, a), share) for q, a in turns)
+    prompt = (f"Current summary:\n{summary or '(none yet)'}\n\nNew turns:\n{transcript}\n\n"
+              f"Rewrite the summary to cover both in at most {words} words. Keep the topics asked about, "
+              f"key facts, definitions and conclusions the tutor gave, and anything the student said about "
+              f"themselves or their goals. Drop pleasantries.")
+    try:
+        out = chat(SUMMARY_SYSTEM, prompt, temperature=0.2, feature="qna.summary").strip()
+    except Exception as e:
+        # keep going with a crude summary rather than losing the thread (or the budget)
+        log.warning("Conversation summary failed: %s", e)
+        out = " ".join(filter(None, [summary, "Earlier questions: " + "; ".join(q for q, _ in turns) + "."]))
+    return _clip(out, QA_SUMMARY_TOKENS)
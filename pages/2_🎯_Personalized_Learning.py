@@ -1,6 +1,7 @@
 import streamlit as st
-from core.utils import inject_css, record_event, parse_json_maybe
+from core.utils import inject_css, record_event, answer_card, stream_html, stream_items
 from modules.personalization import study_plan, flashcards as make_flashcards
+from core.presets import PLAN_PRESETS
 from core.sidebar import render_sidebar
 render_sidebar("Personalized Learning")
 
@@ -32,45 +33,25 @@ if "pl_last" not in st.session_state:
 
 # ------------------------- Quick presets -------------------------
 st.markdown("#### One-click presets")
-PRESETS = [
-    {
-        "name": "Student",
-        "course": "Calculus I",
-        "grade": "Beginner",
-        "goals": "Master limits, derivatives, and basic integrals; build problem-solving speed; aim for an A.",
-        "hours": 6
-    },
-    {
-        "name": "Student",
-        "course": "Data Structures",
-        "grade": "Intermediate",
-        "goals": "Solidify arrays, stacks, queues, linked lists, trees; practice complexity analysis and coding patterns.",
-        "hours": 8
-    },
-    {
-        "name": "Student",
-        "course": "Machine Learning Basics",
-        "grade": "Beginner",
-        "goals": "Understand train/test splits, linear/logistic regression, overfitting/regularization; implement in scikit-learn.",
-        "hours": 7
-    },
-]
+PRESETS = PLAN_PRESETS
 cols = st.columns(3)
 preset_clicked = None
 for i, p in enumerate(PRESETS):
     if cols[i].button(p["course"], key=f"pl_preset_{i}", use_container_width=True):
         preset_clicked = p
 
+# a new plan streams into the "Show plan" section below
+pending_plan = None
 if preset_clicked:
-    with st.spinner("Designing your study plan…"):
-        plan = study_plan(
-            preset_clicked["name"],
-            preset_clicked["course"],
-            preset_clicked["grade"],
-            preset_clicked["goals"],
-            preset_clicked["hours"]
-        )
-    st.session_state.pl_last = {
+    plan = study_plan(
+        preset_clicked["name"],
+        preset_clicked["course"],
+        preset_clicked["grade"],
+        preset_clicked["goals"],
+        preset_clicked["hours"],
+        stream=True
+    )
+    pending_plan = {
         "title": f"{preset_clicked['course']} · {preset_clicked['grade']}",
         "plan": plan,
         "meta": preset_clicked
@@ -104,9 +85,8 @@ if submitted:
     else:
         # Soft prompt shaping via goals (keeps backend unchanged)
         extra = f"\nPreferences: {', '.join(prefs) or 'none'}; Focus: {focus}; Constraints: {constraints or 'none'}."
-        with st.spinner("Designing your study plan…"):
-            plan = study_plan(name.strip(), course.strip(), grade.strip(), goals.strip() + extra, hours)
-        st.session_state.pl_last = {
+        plan = study_plan(name.strip(), course.strip(), grade.strip(), goals.strip() + extra, hours, stream=True)
+        pending_plan = {
             "title": f"{course.strip()} · {grade.strip()}",
             "plan": plan,
             "meta": {"name": name, "course": course, "grade": grade, "goals": goals, "hours": hours,
@@ -115,14 +95,14 @@ if submitted:
         record_event("qna", {"feature":"personalized_plan","course":course})
 
 # ------------------------- Show plan (if available) -------------------------
-if st.session_state.pl_last:
+if pending_plan or st.session_state.pl_last:
     st.markdown("---")
-    st.markdown(f"### 📋 4-week Plan — {st.session_state.pl_last['title']}")
-    st.markdown(f"""
-    <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-      <div style="line-height:1.6;white-space:pre-wrap">{st.session_state.pl_last['plan']}</div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(f"### 📋 4-week Plan — {(pending_plan or st.session_state.pl_last)['title']}")
+    if pending_plan:
+        pending_plan["plan"] = stream_html(pending_plan["plan"], answer_card)
+        st.session_state.pl_last = pending_plan
+    else:
+        st.markdown(answer_card(st.session_state.pl_last["plan"]), unsafe_allow_html=True)
     st.download_button(
         "Download plan (.txt)",
         data=st.session_state.pl_last["plan"],
@@ -147,15 +127,13 @@ if gen_fc:
     if not topic.strip():
         st.warning("Please enter a topic for flashcards.")
     else:
-        with st.spinner("Generating flashcards…"):
-            out = make_flashcards(topic.strip(), num)
-        obj = parse_json_maybe(out) or {}
-        cards = obj.get("cards", [])
+        cards = stream_items(make_flashcards(topic.strip(), num, stream=True),
+                             lambda i, c: f"**{i}. {c.get('front','')}**", "Generating flashcards…")
         if not cards:
             st.error("Could not parse flashcards. Please try again.")
         else:
-            st.session_state.pl_fc = {"topic": obj.get("topic", topic), "cards": cards}
-            st.success(f"Flashcards ready for **{obj.get('topic', topic)}**.")
+            st.session_state.pl_fc = {"topic": topic.strip(), "cards": cards}
+            st.success(f"Flashcards ready for **{topic.strip()}**.")
             record_event("qna", {"feature":"flashcards","topic":topic})
 
 if st.session_state.pl_fc:
@@ -1,6 +1,9 @@
 import streamlit as st
-from core.utils import inject_css, record_event
-from modules.qa import academic_qa
+from core.utils import inject_css, record_event, answer_card, stream_html
+from modules.qa import academic_qa, add_turn, context_window, conversation_qa, new_conversation
+from core.config import QA_CONTEXT_TOKENS
+from core.ratelimit import estimate_tokens
+from core.presets import QNA_PRESETS
 from core.sidebar import render_sidebar
 render_sidebar("Academic Q&A")
 
@@ -31,44 +34,32 @@ st.markdown("""
 # --------------------------------------------
 # Domain + presets
 # --------------------------------------------
-PRESETS = {
-    "general": [
-        "Summarize the key differences between correlation and causation with examples.",
-        "How do I structure a strong literature review chapter?",
-        "Explain Bloom’s taxonomy and how to apply it while studying."
-    ],
-    "math": [
-        "Explain backpropagation in simple terms with a tiny numeric example.",
-        "What’s the difference between eigenvalues and singular values?",
-        "How does gradient descent differ from Newton’s method?"
-    ],
-    "cs": [
-        "Explain time complexity vs space complexity with examples.",
-        "What is normalization in databases? Show a quick example.",
-        "How do hash tables handle collisions? Compare methods."
-    ],
-    "biology": [
-        "Explain CRISPR-Cas9 editing in simple steps.",
-        "Innate vs adaptive immunity—compare with examples.",
-        "How do vaccines generate immunological memory?"
-    ],
-    "economics": [
-        "Explain price elasticity of demand with a quick example.",
-        "Key differences between monetary and fiscal policy?",
-        "What is comparative advantage? Give a simple scenario."
-    ],
-    "history": [
-        "What were the core causes of World War I in brief?",
-        "Compare Enlightenment thinkers: Locke vs Rousseau.",
-        "How did the Industrial Revolution change labor?"
-    ],
-}
+PRESETS = QNA_PRESETS
 
 st.markdown("#### Pick a domain")
 domain = st.segmented_control(
     "Choose a subject area", list(PRESETS.keys()), selection_mode="single", default="general", key="qna_domain"
 )
 
+# --------------------------------------------
+# Conversation mode: follow-ups are sent with a bounded summary of the session
+# --------------------------------------------
+if "qna_convo" not in st.session_state:
+    st.session_state["qna_convo"] = new_conversation()
+
+colm, coln = st.columns([3, 1.2])
+with colm:
+    multi = st.toggle("Conversation mode (follow-up questions remember this session)", key="qna_multi")
+with coln:
+    if st.button("New conversation", use_container_width=True, disabled=not multi):
+        st.session_state["qna_convo"] = new_conversation()
+convo = st.session_state["qna_convo"]
+
+def ask(question: str, guidance: str=""):
+    if multi:
+        return conversation_qa(question, convo, domain, stream=True, guidance=guidance)
+    return academic_qa(question, domain, stream=True, guidance=guidance)
+
 st.markdown("#### Quick questions (click to run)")
 presets = PRESETS.get(domain, [])
 cols = st.columns(3)
@@ -79,13 +70,11 @@ for i, qtext in enumerate(presets):
 
 # --------------------------------------------
 # Answer logic for preset click
+# (the answer streams into the display section below)
 # --------------------------------------------
+pending = None  # (question, domain, stream of answer pieces)
 if clicked:
-    with st.spinner("Thinking..."):
-        ans = academic_qa(clicked.strip(), domain)
-    st.session_state["qna_last_q"] = clicked.strip()
-    st.session_state["qna_last_domain"] = domain
-    st.session_state["qna_last_ans"] = ans
+    pending = (clicked.strip(), domain, ask(clicked.strip()))
     record_event("qna", {"question": clicked[:120], "domain": domain})
 
 # --------------------------------------------
@@ -125,28 +114,34 @@ if go:
             "Examples first": "Start with 1-2 short examples, then explain theory.",
         }[focus]
 
-        prompt = f"{q.strip()}\n\nGuidance: {extra} {extra2}"
-        with st.spinner("Thinking..."):
-            ans = academic_qa(prompt, domain)
-        st.session_state["qna_last_q"] = q.strip()
-        st.session_state["qna_last_domain"] = domain
-        st.session_state["qna_last_ans"] = ans
+        pending = (q.strip(), domain, ask(q.strip(), guidance=f"{extra} {extra2}"))
         record_event("qna", {"question": q[:120], "domain": domain})
 
 # --------------------------------------------
 # Display answer (if any)
 # --------------------------------------------
-if "qna_last_ans" in st.session_state:
+if pending or "qna_last_ans" in st.session_state:
     st.markdown("---")
     st.markdown("### Answer")
-    st.markdown(f"""
-    <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-      <div class="subtle" style="margin-bottom:6px">
-        Asked: <b>{st.session_state.get("qna_last_q","")}</b> · Domain: <b>{st.session_state.get("qna_last_domain","")}</b>
-      </div>
-      <div style="line-height:1.6">{st.session_state["qna_last_ans"]}</div>
-    </div>
-    """, unsafe_allow_html=True)
+    if pending:
+        asked, asked_domain, pieces = pending
+        subtitle = f"Asked: <b>{asked}</b> · Domain: <b>{asked_domain}</b>"
+        ans = stream_html(pieces, lambda text: answer_card(text, subtitle))
+        st.session_state["qna_last_q"] = asked
+        st.session_state["qna_last_domain"] = asked_domain
+        st.session_state["qna_last_ans"] = ans
+        if multi and ans:
+            add_turn(convo, asked, ans)
+    else:
+        subtitle = (f'Asked: <b>{st.session_state.get("qna_last_q","")}</b> · '
+                    f'Domain: <b>{st.session_state.get("qna_last_domain","")}</b>')
+        st.markdown(answer_card(st.session_state["qna_last_ans"], subtitle), unsafe_allow_html=True)
+
+    if multi and convo["turns"]:
+        used = estimate_tokens(context_window(convo), completion=0)
+        st.caption(f"Conversation: {len(convo['turns'])} recent turn(s) kept"
+                   + (f", earlier ones condensed into a summary ({convo['compactions']}×)" if convo["summary"] else "")
+                   + f" · context ~{used}/{QA_CONTEXT_TOKENS} tokens")
 
     st.download_button(
         "Download answer (.txt)",
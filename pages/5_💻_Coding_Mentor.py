@@ -1,6 +1,8 @@
 import streamlit as st
-from core.utils import inject_css, record_event
-from modules.coding import code_review, debug_help, concept_explain
+from core.utils import inject_css, record_event, answer_card, stream_html
+from modules.coding import code_review, chunked_review, debug_help, concept_explain, project_files, project_review
+from core.config import CODE_REVIEW_CHUNK_CHARS
+from core.presets import REVIEW_PRESETS, DEBUG_PRESETS, CONCEPT_PRESETS, CODING_LANGS, concept_preset_prompt
 from core.sidebar import render_sidebar
 render_sidebar("Coding Mentor")
 
@@ -26,20 +28,13 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-tab1, tab2, tab3 = st.tabs(["🧹 Code review", "🛠️ Debug help", "📘 Explain concept"])
+tab1, tab2, tab3, tab4 = st.tabs(["🧹 Code review", "🛠️ Debug help", "📘 Explain concept", "📦 Project review"])
 
 # =========================================================
 # Tab 1: Code Review
 # =========================================================
 with tab1:
     st.markdown("#### Quick review modes (click to run on your code)")
-    REVIEW_PRESETS = [
-        ("Clean code & readability", "Focus on clarity, naming, comments, and structure."),
-        ("Performance & complexity", "Identify hotspots and reduce time/space complexity."),
-        ("Security & edge cases", "Spot injection risks, unsafe eval, and missing checks."),
-        ("Refactor with functions/classes", "Propose modularization with functions/classes."),
-        ("Docstrings & type hints", "Add concise docstrings and Python type hints."),
-    ]
     cols = st.columns(5)
     review_click = None
     for i, (title, _) in enumerate(REVIEW_PRESETS):
@@ -49,28 +44,30 @@ with tab1:
     st.markdown("---")
     c1, c2 = st.columns([1, 1])
     with c1:
-        lang = st.selectbox("Language", ["python","javascript","java","c++","c","go","rust"], index=0)
+        lang = st.selectbox("Language", CODING_LANGS, index=0)
     with c2:
         tone = st.selectbox("Tone", ["Pragmatic", "Strict", "Friendly"], index=0,
                             help="Affects how the review is worded.")
 
     code = st.text_area("Paste your code", height=240, placeholder="Drop your function/class/module here…")
 
+    def show_chunked_review(notes: str = ""):
+        # large files: sections reviewed in parallel, findings merged into one report
+        with st.spinner("Large file: reviewing it section by section…"):
+            st.markdown(chunked_review(code, lang, notes))
+
     # Run preset review if clicked
     if review_click is not None:
         if not code.strip():
             st.info("Paste your code above, then click the review preset again.")
         else:
             focus_msg = REVIEW_PRESETS[review_click][1]
-            prompt = f"{code}\n\nReviewer focus: {focus_msg}\nTone: {tone}."
-            with st.spinner("Reviewing code…"):
-                out = code_review(prompt, lang)
             st.markdown("### Review")
-            st.markdown(f"""
-            <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-              <div style="line-height:1.6;white-space:pre-wrap">{out}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            if len(code) > CODE_REVIEW_CHUNK_CHARS:
+                show_chunked_review(f"Reviewer focus: {focus_msg}\nTone: {tone}.")
+            else:
+                prompt = f"{code}\n\nReviewer focus: {focus_msg}\nTone: {tone}."
+                out = stream_html(code_review(prompt, lang, stream=True), answer_card)
             record_event("coding", {"type":"review","lang":lang,"focus":REVIEW_PRESETS[review_click][0]})
 
     # Manual review button
@@ -78,14 +75,11 @@ with tab1:
         if not code.strip():
             st.warning("Please paste some code.")
         else:
-            with st.spinner("Reviewing code…"):
-                out = code_review(code, lang)
             st.markdown("### Review")
-            st.markdown(f"""
-            <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-              <div style="line-height:1.6;white-space:pre-wrap">{out}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            if len(code) > CODE_REVIEW_CHUNK_CHARS:
+                show_chunked_review()
+            else:
+                out = stream_html(code_review(code, lang, stream=True), answer_card)
             record_event("coding", {"type":"review","lang":lang})
 
 # =========================================================
@@ -93,13 +87,6 @@ with tab1:
 # =========================================================
 with tab2:
     st.markdown("#### Common issues (1-click diagnose)")
-    DEBUG_PRESETS = [
-        ("NoneType is not subscriptable (Python)", "TypeError: 'NoneType' object is not subscriptable"),
-        ("List index out of range (Python)", "IndexError: list index out of range"),
-        ("CORS error (Web/JS)", "Access to fetch at '…' from origin '…' has been blocked by CORS policy"),
-        ("Module not found (Node/Python)", "ModuleNotFoundError / Cannot find module 'x'"),
-        ("NullPointerException (Java)", "java.lang.NullPointerException"),
-    ]
     cols = st.columns(5)
     dbg_click = None
     for i, (label, errtxt) in enumerate(DEBUG_PRESETS):
@@ -107,35 +94,23 @@ with tab2:
             dbg_click = i
 
     st.markdown("---")
-    lang2 = st.selectbox("Language ", ["python","javascript","java","c++","c","go","rust"], key="dbg_lang")
+    lang2 = st.selectbox("Language ", CODING_LANGS, key="dbg_lang")
     err = st.text_area("Paste error message/stacktrace", height=140, placeholder="Exact error output helps a ton.")
     snip = st.text_area("Optional: related code snippet", height=140, placeholder="The few lines around the error…")
 
     # If a preset was clicked, run instantly (uses current snippet if provided)
     if dbg_click is not None:
         err_to_run = DEBUG_PRESETS[dbg_click][1]
-        with st.spinner("Diagnosing…"):
-            out = debug_help(err_to_run if not err.strip() else err, snip, lang2)
         st.markdown("### Diagnosis & Fix")
-        st.markdown(f"""
-        <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-          <div style="line-height:1.6;white-space:pre-wrap">{out}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        out = stream_html(debug_help(err_to_run if not err.strip() else err, snip, lang2, stream=True), answer_card)
         record_event("coding", {"type":"debug","lang":lang2,"preset":DEBUG_PRESETS[dbg_click][0]})
 
     if st.button("Diagnose error", use_container_width=True):
         if not err.strip() and not snip.strip():
             st.warning("Please paste an error or snippet (or click a preset above).")
         else:
-            with st.spinner("Diagnosing…"):
-                out = debug_help(err, snip, lang2)
             st.markdown("### Diagnosis & Fix")
-            st.markdown(f"""
-            <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-              <div style="line-height:1.6;white-space:pre-wrap">{out}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            out = stream_html(debug_help(err, snip, lang2, stream=True), answer_card)
             record_event("coding", {"type":"debug","lang":lang2})
 
 # =========================================================
@@ -143,14 +118,6 @@ with tab2:
 # =========================================================
 with tab3:
     st.markdown("#### Quick topics (click to run)")
-    CONCEPT_PRESETS = [
-        "Big-O notation with simple examples",
-        "Async vs threading (Python/JS)",
-        "REST vs GraphQL: when to choose which?",
-        "SQL joins (inner/left/right/full) with small tables",
-        "OOP: encapsulation, inheritance, polymorphism",
-        "Dependency injection: what and why?",
-    ]
     cols = st.columns(3)
     concept_click = None
     for i, label in enumerate(CONCEPT_PRESETS):
@@ -159,30 +126,56 @@ with tab3:
 
     st.markdown("---")
     topic = st.text_input("Concept to explain", placeholder="e.g., async/await")
-    lang3 = st.selectbox("Language  ", ["python","javascript","java","c++","c","go","rust"], key="exp")
+    lang3 = st.selectbox("Language  ", CODING_LANGS, key="exp")
 
     if concept_click is not None:
-        prompt = f"{CONCEPT_PRESETS[concept_click]} — provide a brief explanation with a tiny example."
-        with st.spinner("Explaining…"):
-            out = concept_explain(prompt, lang3)
+        prompt = concept_preset_prompt(CONCEPT_PRESETS[concept_click])
         st.markdown("### Explanation")
-        st.markdown(f"""
-        <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-          <div style="line-height:1.6;white-space:pre-wrap">{out}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        out = stream_html(concept_explain(prompt, lang3, stream=True), answer_card)
         record_event("coding", {"type":"concept","lang":lang3,"preset":CONCEPT_PRESETS[concept_click]})
 
     if st.button("Explain", use_container_width=True):
         if not topic.strip():
             st.warning("Please enter a concept or click a preset above.")
         else:
-            with st.spinner("Explaining…"):
-                out = concept_explain(topic, lang3)
             st.markdown("### Explanation")
-            st.markdown(f"""
-            <div class="card pop" style="border-left: 4px solid rgba(0,194,209,.65);">
-              <div style="line-height:1.6;white-space:pre-wrap">{out}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            out = stream_html(concept_explain(topic, lang3, stream=True), answer_card)
             record_event("coding", {"type":"concept","lang":lang3})
+
+# =========================================================
+# Tab 4: Project Review
+# =========================================================
+with tab4:
+    st.markdown("#### Review a whole project")
+    st.caption("Upload a .zip or a folder. Each file's review is cached by its content, "
+               "so after an edit only the changed files are reviewed again.")
+    p1, p2 = st.columns([1, 1])
+    with p1:
+        zip_up = st.file_uploader("Project .zip", type=["zip"], key="proj_zip")
+    with p2:
+        dir_up = st.file_uploader("…or a project folder", accept_multiple_files="directory", key="proj_dir")
+    tone4 = st.selectbox("Tone ", ["Pragmatic", "Strict", "Friendly"], index=0, key="proj_tone")
+
+    if st.button("Review project", type="primary", use_container_width=True):
+        uploads = ([(zip_up.name, zip_up.getvalue())] if zip_up else []) + [(f.name, f.getvalue()) for f in dir_up or []]
+        files, skipped = project_files(uploads)
+        if not files:
+            st.warning("No source files found. Upload a .zip or folder containing code.")
+        else:
+            with st.spinner(f"Reviewing {len(files)} file(s)…"):
+                st.session_state["proj_review"] = dict(project_review(files, f"Tone: {tone4}."), skipped=skipped)
+            record_event("coding", {"type": "project", "n": len(files)})
+
+    if st.session_state.get("proj_review"):
+        res = st.session_state["proj_review"]
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Files", res["files"])
+        m2.metric("Reviewed now", res["reviewed"])
+        m3.metric("From cache", res["cached"])
+        m4.metric("Findings", res["findings"])
+        st.markdown(res["report"])
+        if res["skipped"]:
+            with st.expander(f"Skipped ({len(res['skipped'])})"):
+                st.markdown("\n".join(f"- {s}" for s in res["skipped"]))
+        st.download_button("Download report (.md)", res["report"], file_name="project_review.md",
+                           mime="text/markdown", use_container_width=True)
@@ -1,9 +1,11 @@
 import time
 import streamlit as st
-from core.utils import inject_css, record_event, parse_json_maybe
-from core.models_groq import generate_quiz
+from core.utils import inject_css, record_event, stream_items
+from core.models_groq import stream_quiz
+from core.qbank import fingerprint
+from core.presets import QUIZ_PRESETS, QUIZ_DEFAULT_N, QUIZ_DEFAULT_DIFFICULTY
 from core.evaluation import quiz_score
-from modules.personalization import flashcards as make_flashcards  # uses Groq; returns JSON string
+from modules.personalization import flashcards as make_flashcards  # uses Groq; stream=True yields cards
 from core.sidebar import render_sidebar
 
 # Page config FIRST
@@ -37,6 +39,8 @@ if "quiz" not in st.session_state:
     st.session_state.quiz = None
 if "quiz_started_at" not in st.session_state:
     st.session_state.quiz_started_at = None
+if "quiz_seen" not in st.session_state:
+    st.session_state.quiz_seen = []  # fingerprints of questions served to this student, newest last
 if "last_results" not in st.session_state:
     st.session_state.last_results = None
 if "fc_json" not in st.session_state:
@@ -48,14 +52,7 @@ if "fc_json" not in st.session_state:
 with tab_quiz:
     # ---------------- Preset topics ----------------
     st.markdown("#### One-click topics")
-    PRESETS = [
-        "Data Structures (Arrays/Stacks/Queues)",
-        "Time Complexity & Big-O",
-        "SQL Basics & Joins",
-        "OOP Principles",
-        "Networking: OSI vs TCP/IP",
-        "Linear Algebra (Vectors/Matrices)",
-    ]
+    PRESETS = QUIZ_PRESETS
     cols = st.columns(3)
     preset_clicked = None
     for i, label in enumerate(PRESETS):
@@ -67,8 +64,8 @@ with tab_quiz:
     # ---------------- Controls ----------------
     c1, c2, c3 = st.columns([1.6, 0.9, 1.1])
     topic = c1.text_input("Quiz topic", value=(preset_clicked or ""), placeholder="e.g., Data Structures")
-    nq = c2.slider("Questions", 3, 15, 5)
-    difficulty = c3.segmented_control("Difficulty", options=["easy","medium","hard"], default="medium")
+    nq = c2.slider("Questions", 3, 15, QUIZ_DEFAULT_N)
+    difficulty = c3.segmented_control("Difficulty", options=["easy","medium","hard"], default=QUIZ_DEFAULT_DIFFICULTY)
 
     # Generate actions
     gen_col1, gen_col2 = st.columns([1,1])
@@ -91,10 +88,15 @@ with tab_quiz:
         if not topic.strip():
             st.warning("Please enter a topic or click a preset above.")
         else:
-            with st.spinner("Generating quiz…"):
-                raw = generate_quiz(topic.strip(), nq, difficulty)
-            obj = parse_json_maybe(raw)
-            if not obj or "questions" not in obj:
+            # questions show as they stream in; the interactive quiz renders below once all have arrived
+            questions = stream_items(
+                stream_quiz(topic.strip(), nq, difficulty, exclude=st.session_state.quiz_seen),
+                lambda i, q: f"**Q{i}. {q['q']}**  \n" + "  \n".join(f"{l}. {c}" for l, c in zip("ABCD", q["choices"])),
+                "Generating quiz…",
+            )
+            obj = {"topic": topic.strip(), "questions": questions} if questions else None
+            st.session_state.quiz_seen = (st.session_state.quiz_seen + [fingerprint(q) for q in questions])[-500:]
+            if not obj:
                 st.error("Quiz generation failed. Please try again.")
             else:
                 # Reset previous selections
@@ -228,10 +230,10 @@ with tab_cards:
         if not fc_topic.strip():
             st.warning("Please enter a topic.")
         else:
-            with st.spinner("Generating flashcards…"):
-                raw = make_flashcards(fc_topic.strip(), fc_n)
-            obj = parse_json_maybe(raw)
-            if not obj or "cards" not in obj:
+            cards = stream_items(make_flashcards(fc_topic.strip(), fc_n, stream=True),
+                                 lambda i, c: f"**{i}. {c.get('front', '')}**", "Generating flashcards…")
+            obj = {"topic": fc_topic.strip(), "cards": cards} if cards else None
+            if not obj:
                 st.error("Could not parse flashcards. Please retry.")
             else:
                 st.session_state.fc_json = obj